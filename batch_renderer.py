@@ -0,0 +1,109 @@
+#batch_renderer.py
+# Renderizado por lotes sin interfaz: aplica un horario de Coppers a imágenes indexadas
+# y guarda el resultado en PNG, repartiendo los fotogramas en un pool de procesos.
+# Las imágenes truecolor se cuantizan antes a una paleta Genesis de 16 colores.
+#
+#   python batch_renderer.py frames/ --copper 0:base.pal --copper 64:cielo.pal -o previews/
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from frame_buffer import FrameBuffer
+from palette_table import PaletteTable
+from quantizer import quantize_bands
+from copper_schedule import CopperSchedule
+from copper import Copper
+from palette_editor import PaletteEditor
+
+IMAGE_EXTENSIONS = (".png", ".bmp", ".gif", ".pcx", ".tga")
+
+
+def parse_copper_spec(spec):
+    # Formato POSICION:ARCHIVO.pal
+    position, separator, path = spec.partition(":")
+    if not separator or not position.isdigit():
+        raise argparse.ArgumentTypeError(f"Copper no válido (se espera POSICION:ARCHIVO.pal): {spec}")
+    return int(position), path
+
+
+def collect_images(inputs):
+    image_paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    image_paths.append(os.path.join(path, name))
+        else:
+            image_paths.append(path)
+    return image_paths
+
+
+def render_image(image, copper_palettes):
+    # copper_palettes: lista de (posición, colores); devuelve la imagen RGB resultante
+    if image.mode == "P":
+        frame_buffer = FrameBuffer.from_image(image)
+    else:
+        # Una sola franja: la paleta de la imagen hace de paleta 0, como en un PNG indexado
+        indices, band_palettes = quantize_bands(image, [0])
+        table = PaletteTable()
+        table.add(band_palettes[0][1])
+        frame_buffer = FrameBuffer(indices, table)
+    palette_table = frame_buffer.palette_table
+    coppers = CopperSchedule(frame_buffer.height)
+    for position, colors in copper_palettes:
+        coppers.add(Copper(position=position, palette_id=palette_table.add(colors), palette_table=palette_table))
+    frame_buffer.set_line_palettes(0, coppers.line_palette_table())
+    return frame_buffer.to_image()
+
+
+def render_file(job):
+    image_path, output_path, copper_palettes = job
+    with Image.open(image_path) as image:
+        render_image(image, copper_palettes).save(output_path)
+    return output_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Renderiza imágenes con efecto Copper sin abrir el editor.")
+    parser.add_argument("inputs", nargs="+", help="Imágenes indexadas o directorios de fotogramas")
+    parser.add_argument("-c", "--copper", action="append", default=[], type=parse_copper_spec,
+                        metavar="POSICION:ARCHIVO.pal", help="Copper en una línea con la paleta de un archivo PAL")
+    parser.add_argument("-o", "--output", default=".", help="Directorio de salida")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Número de procesos (por defecto, uno por CPU)")
+    args = parser.parse_args(argv)
+
+    # Las paletas se leen una sola vez y se envían ya resueltas a cada proceso
+    copper_palettes = []
+    for position, path in args.copper:
+        try:
+            copper_palettes.append((position, PaletteEditor.load_palette_from_file(path)))
+        except (OSError, ValueError) as error:
+            parser.error(f"No se pudo leer la paleta del Copper {position}:{path}: {error}")
+    jobs = []
+    sources = {}
+    for image_path in collect_images(args.inputs):
+        name = os.path.splitext(os.path.basename(image_path))[0] + ".png"
+        # Dos entradas con el mismo nombre se pisarían en el directorio de salida
+        if name in sources:
+            parser.error(f"{sources[name]} y {image_path} se guardarían los dos como {name}")
+        sources[name] = image_path
+        jobs.append((image_path, os.path.join(args.output, name), copper_palettes))
+    os.makedirs(args.output, exist_ok=True)
+
+    failures = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [(job[0], executor.submit(render_file, job)) for job in jobs]
+        for image_path, future in futures:
+            try:
+                print(future.result())
+            except (OSError, ValueError) as error:
+                failures += 1
+                print(f"{image_path}: {error}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
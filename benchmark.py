@@ -0,0 +1,255 @@
+#benchmark.py
+# Benchmarks de los caminos críticos de render y edición. Se ejecuta sin pantalla
+# (plataforma Qt offscreen) y escribe los resultados en JSON para comparar versiones:
+#
+#   python benchmark.py -o actual.json
+#   python benchmark.py --compare anterior.json
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from frame_buffer import FrameBuffer
+from image_line import ImageLine
+from palette_editor import PaletteEditor
+from copper_schedule import CopperSchedule
+from copper import Copper
+from edit_history import EditHistory, PaletteColorEdit
+from frame_set import FrameSet
+from frame_cache import FrameCache, DEFAULT_CACHE_BYTES
+from frame_compose import BandCompositor
+
+IMAGE_SIZES = [(256, 224), (320, 224), (640, 224)]
+FRAME_SET_SIZE = 8
+# Separación entre Coppers: una franja cada 32 líneas, cada 8 y uno por línea
+COPPER_SPACINGS = [32, 8, 1]
+ZOOM_LEVELS = [1.0, 1.5, 2.0, 3.0, 4.0, 5.0, 6.0]
+
+
+def make_image(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    image = Image.fromarray(rng.integers(0, 16, (height, width), dtype=np.uint8), "P")
+    image.putpalette(rng.integers(0, 256, 48, dtype=np.uint8).tobytes())
+    return image
+
+
+def random_palette(rng):
+    return [tuple(color) for color in rng.integers(0, 256, (16, 3)).tolist()]
+
+
+def measure(function, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        function(state)
+        times.append((time.perf_counter() - start) * 1000.0)
+    return {"mean_ms": float(np.mean(times)), "min_ms": float(np.min(times)), "runs": repeat}
+
+
+def make_coppers(frame_buffer, spacing, seed=0):
+    # Coppers con sus paletas ya en la tabla, sin programar todavía
+    rng = np.random.default_rng(seed)
+    palette_table = frame_buffer.palette_table
+    coppers = [Copper(position=0, palette_id=0, palette_table=palette_table)]
+    for position in range(spacing, frame_buffer.height, spacing):
+        coppers.append(Copper(position=position, palette_id=palette_table.add(random_palette(rng)),
+                              palette_table=palette_table))
+    return coppers
+
+
+def build_schedule(frame_buffer, spacing, seed=0):
+    return CopperSchedule(frame_buffer.height, make_coppers(frame_buffer, spacing, seed))
+
+
+def core_benchmarks(width, height, repeat, image_path):
+    results = []
+    size = f"{width}x{height}"
+
+    def load(_):
+        with Image.open(image_path) as image:
+            frame_buffer = FrameBuffer.from_image(image)
+        [ImageLine(frame_buffer, y) for y in range(frame_buffer.height)]
+    results.append({"name": "load_image_lines", "size": size, **measure(load, repeat)})
+
+    frame_buffer = FrameBuffer.from_image(make_image(width, height))
+    results.append({"name": "get_combined_image", "size": size,
+                    **measure(lambda _: frame_buffer.to_image(), repeat)})
+
+    # La composición RGB32 del hilo de render del editor, aquí en el hilo actual. Sin caché para
+    # medir la recomposición entera; el resto, con la caché de fotogramas del editor
+    uncached = BandCompositor(frame_buffer, FrameCache(0))
+    compositor = BandCompositor(frame_buffer, FrameCache(DEFAULT_CACHE_BYTES))
+
+    def full_render(_):
+        frame_buffer.mark_lines_dirty()
+        uncached.render()
+    results.append({"name": "render_full", "size": size, **measure(full_render, repeat)})
+
+    palette_editor = PaletteEditor(frame_buffer)
+    colors = iter(np.random.default_rng(1).integers(0, 256, (repeat, 3)).tolist())
+
+    def change_color(_):
+        palette_editor.change_palette_color_at_index(3, tuple(next(colors)))
+        compositor.render()
+    results.append({"name": "change_palette_color_at_index", "size": size, **measure(change_color, repeat)})
+
+    for spacing in COPPER_SPACINGS:
+        def make_target():
+            target = FrameBuffer.from_image(make_image(width, height))
+            return target, make_coppers(target, spacing)
+
+        def schedule_and_apply(state):
+            # Los dos pasos de CopperEffectEditor.apply_copper_effect (que necesita la interfaz):
+            # resolver la paleta de cada línea del horario y copiarla al FrameBuffer
+            target, copper_list = state
+            coppers = CopperSchedule(target.height, copper_list)
+            target.set_line_palettes(0, coppers.line_palette_table())
+        copper_count = len(range(0, height, spacing))
+        results.append({"name": "apply_copper_effect", "size": size, "coppers": copper_count,
+                        **measure(schedule_and_apply, repeat, setup=make_target)})
+
+        dense = FrameBuffer.from_image(make_image(width, height))
+        coppers = build_schedule(dense, spacing)
+        dense.set_line_palettes(0, coppers.line_palette_table())
+        dense_compositor = BandCompositor(dense, FrameCache(DEFAULT_CACHE_BYTES))
+        dense_compositor.render()
+        moving = coppers[len(coppers) // 2]
+        positions = iter(np.random.default_rng(2).integers(1, height, repeat).tolist())
+
+        def move_copper(_):
+            first_line, _ = coppers.move(moving, next(positions))
+            dense.set_line_palettes(first_line, coppers.line_palette_table()[first_line:])
+            dense_compositor.render()
+        results.append({"name": "move_copper", "size": size, "coppers": copper_count,
+                        **measure(move_copper, repeat)})
+
+    frame_set = FrameSet(frame_buffer, [np.asarray(make_image(width, height, seed)) for seed in range(FRAME_SET_SIZE)])
+    results.append({"name": "render_frame_set", "size": size, "frames": FRAME_SET_SIZE,
+                    **measure(lambda _: frame_set.render_all(), repeat)})
+    frame_set.close()
+
+    def fill_history():
+        history = EditHistory(merge_window=0)
+        for i in range(64):
+            history.do(PaletteColorEdit(frame_buffer.palette_table, 0, i % 16, (0, 0, 0), (i, i, i)))
+        return history
+
+    def undo_all(history):
+        while history.undo():
+            pass
+        compositor.render()
+    results.append({"name": "undo_64_edits", "size": size, **measure(undo_all, repeat, setup=fill_history)})
+    return results
+
+
+def qt_benchmarks(width, height, repeat, image_path):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    application = QApplication.instance() or QApplication(sys.argv[:1])
+    from image_editor_widget import ImageEditorWidget
+
+    results = []
+    size = f"{width}x{height}"
+    editors = []
+
+    def open_editor(_):
+        editors.append(ImageEditorWidget(image_path))
+        editors[-1].frame_renderer.flush()
+        application.processEvents()
+    results.append({"name": "open_editor", "size": size, **measure(open_editor, repeat)})
+
+    editor = editors[-1]
+    levels = iter(ZOOM_LEVELS * repeat)
+
+    def switch_zoom(_):
+        level = next(levels)
+        editor.zoom_radio_buttons[ZOOM_LEVELS.index(level)].setChecked(True)
+        editor.set_zoom_level(level)
+        # grab() fuerza el repintado completo de la vista
+        editor.image_label.grab()
+    results.append({"name": "zoom_switch", "size": size, **measure(switch_zoom, repeat * len(ZOOM_LEVELS))})
+
+    colors = iter(np.random.default_rng(3).integers(0, 256, (repeat, 3)).tolist())
+
+    def recolor(_):
+        editor.palette_editor.change_palette_color_at_index(5, tuple(next(colors)))
+        editor.update_image_with_current_zoom()
+        # El render RGB32 va en segundo plano: se mide hasta tener el fotograma en pantalla
+        editor.frame_renderer.flush()
+        editor.image_label.grab()
+    results.append({"name": "edit_and_redraw", "size": size, **measure(recolor, repeat)})
+    return results
+
+
+def run(repeat, with_qt):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for width, height in IMAGE_SIZES:
+            image_path = os.path.join(directory, f"bench_{width}x{height}.png")
+            make_image(width, height).save(image_path)
+            results += core_benchmarks(width, height, repeat, image_path)
+            if with_qt:
+                results += qt_benchmarks(width, height, repeat, image_path)
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def result_key(result):
+    return (result["name"], result["size"], result.get("coppers"))
+
+
+def compare(report, baseline):
+    # Cociente actual / anterior del tiempo mínimo: > 1 es más lento
+    previous = {result_key(result): result for result in baseline["results"]}
+    for result in report["results"]:
+        old = previous.get(result_key(result))
+        if old:
+            ratio = result["min_ms"] / old["min_ms"] if old["min_ms"] else float("inf")
+            coppers = f" coppers={result['coppers']}" if result.get("coppers") else ""
+            print(f"{result['name']:<32} {result['size']:>8}{coppers:<14} "
+                  f"{old['min_ms']:9.3f} ms -> {result['min_ms']:9.3f} ms  x{ratio:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de render y edición del editor Copper.")
+    parser.add_argument("-n", "--repeat", type=int, default=20, help="Repeticiones por medida")
+    parser.add_argument("-o", "--output", help="Archivo JSON de resultados (por defecto, salida estándar)")
+    parser.add_argument("--compare", help="JSON de una ejecución anterior con el que comparar")
+    parser.add_argument("--no-qt", action="store_true", help="Omitir las medidas que necesitan PyQt5")
+    args = parser.parse_args(argv)
+
+    with_qt = not args.no_qt
+    if with_qt:
+        try:
+            import PyQt5  # noqa: F401
+        except ImportError:
+            print("PyQt5 no disponible: solo se miden los caminos sin Qt", file=sys.stderr)
+            with_qt = False
+
+    report = run(args.repeat, with_qt)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    elif not args.compare:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as file:
+            compare(report, json.load(file))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
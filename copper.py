@@ -0,0 +1,21 @@
+#copper.py
+# Modelo de un Copper, sin dependencias de Qt: lo usan el editor, el renderizado por lotes,
+# los proyectos y los benchmarks.
+
+
+class Copper:
+    # La paleta vive en la PaletteTable compartida; el Copper solo guarda su índice
+    def __init__(self, position, palette_id, palette_table, source_path=None):
+        self.position = position
+        self.palette_id = palette_id
+        self.palette_table = palette_table
+        # Archivo de paleta del que sale la paleta (None si se hizo en el editor); el editor lo vigila
+        self.source_path = source_path
+
+    @property
+    def palette(self):
+        return self.palette_table.get_palette(self.palette_id)
+
+    @palette.setter
+    def palette(self, palette):
+        self.palette_table.set_palette(self.palette_id, palette)
@@ -1,54 +1,63 @@
-from PyQt5.QtWidgets import QLabel, QListWidget, QPushButton, QVBoxLayout, QWidget, QMessageBox
+from PyQt5.QtWidgets import QLabel, QListView, QPushButton, QVBoxLayout, QWidget, QMessageBox
 from PyQt5.QtGui import QPixmap
 from PyQt5.QtCore import Qt
 from new_copper_widget import NewCopperWidget  # Importar el nuevo widget
-
-class Copper:
-    def __init__(self, position, palette):
-        self.position = position
-        self.palette = palette
+from copper_list_model import CopperListModel, CopperItemDelegate
+from edit_history import CopperAddEdit, CopperPaletteEdit, IndexEdit, CompoundEdit
+from remap import remap_indices
+from render_stats import render_stats
+# Copper vive en copper.py, sin Qt; sigue importable desde aquí
+from copper import Copper
 
 class CopperEffectEditor:
-    def __init__(self, image_lines, coppers, side_layout, edit_history, status_label, sender_button=None):
+    def __init__(self, frame_buffer, image_lines, coppers, side_layout, edit_history, status_label, sender_button=None,
+                 on_coppers_changed=None, frame_set=None):
+        self.frame_buffer = frame_buffer
+        # Fotogramas que comparten estos Coppers (la reasignación de píxeles se aplica a todos)
+        self.frame_set = frame_set
         self.image_lines = image_lines
         self.coppers = coppers
+        # Primera línea de la imagen que ocupa la ventana de pantalla de los Coppers
+        self.screen_top = 0
         self.side_layout = side_layout
         self.edit_history = edit_history
         self.status_label = status_label
         self.sender_button = sender_button
-        self.new_copper_widget = None  # Cambiar de NewCopperDialog a NewCopperWidget
+        # Se llama tras añadir o editar un Copper para que el editor redibuje la imagen
+        self.on_coppers_changed = on_coppers_changed
+        # Un único NewCopperWidget, creado la primera vez que se edita un Copper
+        self.new_copper_widget = None
+        self.editing_position = 0
+        self.editing_copper = None
 
         # Llama al método para inicializar la interfaz gráfica
         self.init_ui_elements()
 
     def init_ui_elements(self):
         self.copper_palette_info_label = QLabel()
-        self.copper_list_widget = QListWidget()
+        # Vista sobre el CopperSchedule: solo se pintan las filas visibles y los cambios llegan fila a fila
+        self.copper_list_model = CopperListModel(self.coppers, self.frame_buffer.palette_table)
+        self.copper_list_view = QListView()
+        self.copper_list_view.setModel(self.copper_list_model)
+        self.copper_list_view.setItemDelegate(CopperItemDelegate(self.copper_list_view))
+        self.copper_list_view.setUniformItemSizes(True)
 
         # Conectar el nuevo botón al método launch_new_copper_widget
         if self.sender_button:
             self.sender_button.clicked.connect(lambda: self.launch_new_copper_widget(self.image_lines.index(self.sender_button)))
 
-        # Agregar funcionalidad a los botones de la lista de Coppers
-        self.copper_list_widget.itemClicked.connect(self.show_copper_palette_info)
-        self.copper_list_widget.itemDoubleClicked.connect(self.edit_copper_palette)
+        # Agregar funcionalidad a las filas de la lista de Coppers
+        self.copper_list_view.clicked.connect(self.show_copper_palette_info)
+        self.copper_list_view.doubleClicked.connect(self.edit_copper_palette)
 
         self.copper_palette_info_label.setAlignment(Qt.AlignCenter)
 
-        self.update_copper_list_widget()
-
         self.side_layout.addWidget(self.copper_palette_info_label)
-        self.side_layout.addWidget(self.copper_list_widget)
+        self.side_layout.addWidget(self.copper_list_view)
 
-    def update_copper_list_widget(self):
-        self.copper_list_widget.clear()
-        for i, copper in enumerate(self.coppers):
-            item_text = f"Copper {i + 1} - Posición: {copper.position}"
-            self.copper_list_widget.addItem(item_text)
-
-    def show_copper_palette_info(self, item):
+    def show_copper_palette_info(self, model_index):
         # Obtener el índice del Copper seleccionado
-        index = self.copper_list_widget.row(item)
+        index = model_index.row()
         if index >= 0:
             copper = self.coppers[index]
             palette_text = self.get_palette_text(copper.palette)
@@ -57,63 +66,105 @@ class CopperEffectEditor:
     def get_palette_text(self, palette):
         return ", ".join([str(color) for color in palette])
 
-    def edit_copper_palette(self, item):
-        # Obtener el índice del Copper seleccionado
-        index = self.copper_list_widget.row(item)
+    def edit_copper_palette(self, model_index):
+        index = model_index.row()
         if index >= 0:
             copper = self.coppers[index]
-            if not self.new_copper_widget:
-                self.new_copper_widget = NewCopperWidget(copper.palette, parent=self)
-
-            # Mostrar el widget como un diálogo
-            self.new_copper_widget.show()
+            self.open_new_copper_widget(copper.position, copper.palette, copper)
 
     def launch_new_copper_widget(self, position):
-        if not self.new_copper_widget:
-            previous_palette = self.get_previous_palette()  # Obtener la paleta del copper anterior
-            self.new_copper_widget = NewCopperWidget(previous_palette, parent=None)
+        # La paleta de partida es la del Copper vigente en esa línea
+        copper = self.coppers.copper_at(position)
+        previous_palette = copper.palette if copper else self.get_previous_palette()
+        self.open_new_copper_widget(position, previous_palette)
 
-        # Conectar el slot del widget para actualizar la lista y paletas cuando se acepta
-        self.new_copper_widget.accepted.connect(lambda: self.on_new_copper_widget_accepted(position))
+    def open_new_copper_widget(self, position, previous_palette, copper=None):
+        if not self.new_copper_widget:
+            self.new_copper_widget = NewCopperWidget(previous_palette, parent=self.copper_list_view.parentWidget(),
+                                                     position=position)
+            # Conectar el slot del widget para actualizar la lista y paletas cuando se acepta
+            self.new_copper_widget.accepted.connect(self.on_new_copper_widget_accepted)
+            self.side_layout.addWidget(self.new_copper_widget)
+        self.editing_position = position
+        self.editing_copper = copper
+        self.new_copper_widget.set_target(position, previous_palette)
 
         # Mostrar el widget
         self.new_copper_widget.show()
 
-    def on_new_copper_widget_accepted(self, position):
+    def on_new_copper_widget_accepted(self):
         new_palette = self.new_copper_widget.get_selected_palette()
-        new_copper = Copper(position=position, palette=new_palette)
-        self.coppers.append(new_copper)
-
-        self.show_copper_palettes()
-        self.update_copper_list_widget()
+        remap_mode = self.new_copper_widget.get_remap_mode()
+        source_path = self.new_copper_widget.get_palette_path()
+        # La franja se calcula antes de tocar la lista de Coppers
+        start, stop = self.band_of(self.editing_position, self.editing_copper)
+        # Paleta con la que se ven hoy esas líneas (no la propuesta inicial del widget). Se lee del
+        # FrameBuffer y no del horario: con el efecto Copper desactivado todas se ven con la paleta 0
+        old_palette = self.frame_buffer.palette_table.get_palette(
+            int(self.frame_buffer.line_palettes[self.screen_top + start]))
+        if self.editing_copper is None:
+            palette_table = self.frame_buffer.palette_table
+            new_copper = Copper(position=self.editing_position, palette_id=palette_table.add(new_palette),
+                                palette_table=palette_table, source_path=source_path)
+            edit = CopperAddEdit(self.coppers, new_copper)
+        else:
+            copper = self.editing_copper
+            edit = CopperPaletteEdit(copper, copper.palette, new_palette, source_path)
+        if remap_mode is not None:
+            # Paleta y píxeles reasignados se deshacen juntos
+            edit = CompoundEdit([edit] + self.remap_edits(start, stop, old_palette, new_palette, remap_mode))
+        self.edit_history.do(edit)
+        if self.on_coppers_changed:
+            self.on_coppers_changed()
 
         palette_text = self.get_palette_text_from_widget()
         print(f"Nueva paleta seleccionada: {palette_text}")
 
-    def apply_copper_effect(self, current_palette, button_index=None):
-        position = self.get_copper_position(button_index)
-
-        for i, image_line in enumerate(self.image_lines):
-            copper_instance = self.get_copper_instance_at_position(i)
-
-            if copper_instance and i >= copper_instance.position:
-                image_line.palette_index = copper_instance.palette[i % 16]
-            else:
-                image_line.palette_index = current_palette[i % 16]
+    def band_of(self, position, copper=None):
+        # Líneas de pantalla [inicio, fin) que gobierna (o gobernará) el Copper en position
+        if copper is not None:
+            index = self.coppers.index(copper)
+            stop = self.coppers[index + 1].position if index + 1 < len(self.coppers) else self.coppers.height
+        else:
+            following = self.coppers.coppers_between(position + 1, self.coppers.height)
+            stop = following[0].position if following else self.coppers.height
+        return position, min(stop, self.coppers.height)
+
+    def remap_edits(self, start, stop, old_palette, new_palette, mode):
+        # Las filas de la franja (en la imagen) de cada fotograma pasan a los índices más parecidos de la paleta nueva
+        start += self.screen_top
+        stop += self.screen_top
+        if self.frame_set is not None:
+            self.frame_set.store_current()
+            frames = self.frame_set.frames
+        else:
+            frames = [self.frame_buffer.indices]
+        edits = []
+        with render_stats.stage("remap"):
+            for indices in frames:
+                old_rows = indices[start:stop].copy()
+                new_rows = remap_indices(old_rows, old_palette, new_palette, mode)
+                edits.append(IndexEdit(self.frame_buffer, indices, start, old_rows, new_rows))
+        return edits
+
+    def apply_copper_effect(self, current_palette, button_index=None, first_line=0):
+        position = self.coppers[button_index].position if button_index is not None else 0
+
+        # La tabla por línea ya está resuelta en el CopperSchedule: se copia de una vez y
+        # las líneas por encima de first_line no dependen del cambio
+        with render_stats.stage("copper_apply"):
+            line_palettes = self.coppers.line_palette_table()
+            self.frame_buffer.set_line_palettes(self.screen_top + first_line, line_palettes[first_line:])
 
         # Asegúrate de tener un atributo slider_label definido
         if hasattr(self, 'slider_label'):
             self.slider_label.setText(f"Posición Y del Slider: {position}")
 
         self.status_label.setText("Efecto Copper: Activado")
-        self.show_copper_palettes()
 
     def get_copper_instance_at_position(self, position):
-        for copper in self.coppers:
-            if copper.position == position:
-                return copper
-
-        return None
+        # Copper vigente en esa línea (búsqueda binaria en el CopperSchedule)
+        return self.coppers.copper_at(position)
 
     def show_warning_dialog(self, message):
         warning_dialog = QMessageBox(self)
@@ -123,8 +174,8 @@ class CopperEffectEditor:
         warning_dialog.exec_()
 
     def get_previous_palette(self):
-        if self.edit_history:
-            return self.edit_history[-1]['palettes']
+        if len(self.coppers):
+            return self.coppers[-1].palette
         else:
             return [0] * 16
 
@@ -0,0 +1,68 @@
+#copper_list_model.py
+from PyQt5.QtWidgets import QStyledItemDelegate, QStyle
+from PyQt5.QtGui import QColor
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize
+
+PaletteRole = Qt.UserRole + 1
+ROW_HEIGHT = 24
+SWATCH_SIZE = 12
+
+
+class CopperListModel(QAbstractListModel):
+    # Modelo sobre el CopperSchedule: se avisa a la vista fila a fila, sin reconstruir la lista
+    def __init__(self, coppers, palette_table, parent=None):
+        super().__init__(parent)
+        self.coppers = coppers
+        self.coppers.listeners.append(self.on_schedule_changed)
+        palette_table.listeners.append(self.on_palette_changed)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.coppers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.coppers):
+            return None
+        copper = self.coppers[index.row()]
+        if role == Qt.DisplayRole:
+            return f"Copper {index.row() + 1} - Posición: {copper.position}"
+        if role == PaletteRole:
+            return copper.palette
+        return None
+
+    def on_schedule_changed(self, event, row):
+        if event == "about_to_insert":
+            self.beginInsertRows(QModelIndex(), row, row)
+        elif event == "about_to_remove":
+            self.beginRemoveRows(QModelIndex(), row, row)
+        elif event == "inserted":
+            self.endInsertRows()
+        elif event == "removed":
+            self.endRemoveRows()
+        if event in ("inserted", "removed"):
+            # La numeración de las filas siguientes cambia con inserciones y borrados
+            last = len(self.coppers) - 1
+            if row <= last:
+                self.dataChanged.emit(self.index(row), self.index(last))
+
+    def on_palette_changed(self, palette_id):
+        for row, copper in enumerate(self.coppers):
+            if copper.palette_id == palette_id:
+                self.dataChanged.emit(self.index(row), self.index(row), [PaletteRole])
+
+
+class CopperItemDelegate(QStyledItemDelegate):
+    # Pinta el texto y las 16 muestras de color sin crear widgets por fila
+    def paint(self, painter, option, index):
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+        text_rect = QRect(option.rect.left() + 4, option.rect.top(), 150, option.rect.height())
+        painter.drawText(text_rect, Qt.AlignVCenter | Qt.AlignLeft, index.data(Qt.DisplayRole))
+        top = option.rect.top() + (option.rect.height() - SWATCH_SIZE) // 2
+        for i, color in enumerate(index.data(PaletteRole) or []):
+            painter.fillRect(QRect(text_rect.right() + i * SWATCH_SIZE, top, SWATCH_SIZE - 1, SWATCH_SIZE),
+                             QColor(*color))
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        return QSize(150 + 16 * SWATCH_SIZE, ROW_HEIGHT)
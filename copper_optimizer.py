@@ -0,0 +1,134 @@
+#copper_optimizer.py
+# Reduce las escrituras en CRAM del horario de Coppers sin cambiar la imagen resultante.
+# Cada Copper solo tiene que escribir las entradas que difieren del anterior
+# (genesis_export.build_cram_writes con only_changes), así que conviene que un color que
+# ya está en CRAM siga en la misma ranura: se reordenan los índices de la paleta de cada
+# franja y los píxeles de la franja se renumeran igual, con lo que cada línea se ve idéntica.
+# Una misma permutación para todas las franjas no cambiaría nada (mueve las entradas de los
+# dos lados de cada diferencia); por eso la permutación es por franja.
+from collections import defaultdict
+
+import numpy as np
+
+from genesis_export import rgb_to_cram, PALETTE_SIZE
+from edit_history import CopperPaletteEdit, IndexEdit, CompoundEdit
+
+# Índices que no se mueven: el 0 es el transparente de los planos del VDP
+PINNED_INDICES = (0,)
+
+
+def palette_words(coppers):
+    return np.array([rgb_to_cram(copper.palette[:PALETTE_SIZE]) for copper in coppers], dtype=np.uint16)
+
+
+def changed_entries(words):
+    # Escrituras de cada Copper si solo se escribe lo que cambia; el primero escribe la paleta entera
+    counts = np.full(len(words), PALETTE_SIZE, dtype=np.int32)
+    if len(words) > 1:
+        counts[1:] = (words[1:] != words[:-1]).sum(axis=1)
+    return counts
+
+
+def align_permutation(previous, current, pinned=PINNED_INDICES):
+    # permutation[i] es la ranura nueva del índice i: los colores de current que ya están en
+    # alguna ranura de previous se colocan ahí y el resto ocupa las ranuras que quedan libres
+    permutation = np.full(PALETTE_SIZE, -1, dtype=np.int32)
+    free = [slot for slot in range(PALETTE_SIZE) if slot not in pinned]
+    for index in pinned:
+        permutation[index] = index
+    # Primero lo que ya coincide en su sitio: no se mueve
+    for index in free:
+        if current[index] == previous[index]:
+            permutation[index] = index
+    taken = set(permutation[permutation >= 0].tolist())
+    slots_by_word = defaultdict(list)
+    for slot in free:
+        if slot not in taken:
+            slots_by_word[int(previous[slot])].append(slot)
+    for index in free:
+        if permutation[index] < 0 and slots_by_word[int(current[index])]:
+            permutation[index] = slots_by_word[int(current[index])].pop(0)
+            taken.add(int(permutation[index]))
+    # Sin pareja: a su propia ranura si sigue libre, si no a la primera libre
+    unplaced = [index for index in free if permutation[index] < 0]
+    for index in unplaced:
+        if index not in taken:
+            permutation[index] = index
+            taken.add(index)
+    remaining = [slot for slot in free if slot not in taken]
+    for index in unplaced:
+        if permutation[index] < 0:
+            permutation[index] = remaining.pop(0)
+    return permutation
+
+
+class OptimizationReport:
+    def __init__(self, positions, full, changes_only, optimized):
+        self.positions = positions
+        # Escrituras por Copper: paletas completas, solo cambios y solo cambios tras permutar
+        self.full = full
+        self.changes_only = changes_only
+        self.optimized = optimized
+
+    @property
+    def saved(self):
+        return int(self.full.sum() - self.optimized.sum())
+
+    def __str__(self):
+        total = int(self.full.sum())
+        percent = 100.0 * self.saved / total if total else 0.0
+        return (f"Escrituras CRAM por cuadro: {total} con paletas completas, {int(self.changes_only.sum())} "
+                f"escribiendo solo los cambios, {int(self.optimized.sum())} tras reordenar las paletas "
+                f"({percent:.0f}% menos).\n"
+                f"Máximo en un Copper (sin contar el primero): {self.peak(self.full)} -> {self.peak(self.optimized)}")
+
+    @staticmethod
+    def peak(counts):
+        return int(counts[1:].max()) if len(counts) > 1 else 0
+
+
+def optimize_coppers(coppers):
+    # Devuelve la permutación de cada Copper (None si se queda igual) y el informe de ahorro
+    words = palette_words(coppers)
+    permutations = [None] * len(coppers)
+    optimized = words.copy()
+    # Las paletas compartidas (la de la imagen o la de otro Copper) se ven también fuera de la
+    # franja: no se pueden reordenar sin cambiar esas otras líneas
+    usage = defaultdict(int)
+    for copper in coppers:
+        usage[copper.palette_id] += 1
+    for number in range(1, len(coppers)):
+        copper = coppers[number]
+        if copper.palette_id == 0 or usage[copper.palette_id] > 1:
+            continue
+        permutation = align_permutation(optimized[number - 1], words[number])
+        if (permutation != np.arange(PALETTE_SIZE)).any():
+            permutations[number] = permutation
+            optimized[number, permutation] = words[number]
+    report = OptimizationReport([copper.position for copper in coppers], np.full(len(coppers), PALETTE_SIZE),
+                                changed_entries(words), changed_entries(optimized))
+    return permutations, report
+
+
+def permutation_edit(frame_buffer, frames, coppers, permutations, screen_top=0):
+    # Una sola edición deshacible: paleta reordenada de cada Copper y píxeles renumerados de su
+    # franja en todos los fotogramas
+    edits = []
+    for number, permutation in enumerate(permutations):
+        if permutation is None:
+            continue
+        copper = coppers[number]
+        old_palette = copper.palette
+        new_palette = list(old_palette)
+        for index, slot in enumerate(permutation.tolist()):
+            new_palette[slot] = old_palette[index]
+        # Reordenada ya no es la paleta del archivo: deja de vigilarse (new_source None)
+        edits.append(CopperPaletteEdit(copper, old_palette, new_palette))
+        lookup = np.arange(256, dtype=np.uint8)
+        lookup[:PALETTE_SIZE] = permutation
+        stop = coppers[number + 1].position if number + 1 < len(coppers) else coppers.height
+        start, stop = screen_top + copper.position, screen_top + min(stop, coppers.height)
+        for indices in frames:
+            old_rows = indices[start:stop].copy()
+            edits.append(IndexEdit(frame_buffer, indices, start, old_rows, lookup[old_rows]))
+    return CompoundEdit(edits) if edits else None
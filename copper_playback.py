@@ -0,0 +1,113 @@
+#copper_playback.py
+# Reproducción animada del efecto Copper: en cada fotograma la tabla de paletas por línea
+# se desplaza (rasters en movimiento) y las entradas 1-15 de las paletas rotan (ciclo de
+# paleta). Los fotogramas se calculan sin tocar el CopperSchedule ni el historial y cubren
+# solo la ventana de pantalla que gobiernan los Coppers.
+import time
+from math import gcd
+
+import numpy as np
+from PyQt5.QtCore import QObject, QTimer, Qt, pyqtSignal
+
+from frame_cache import FrameCache
+from render_stats import render_stats
+
+PAL_RATE = 50
+NTSC_RATE = 60
+PALETTE_SIZE = 16
+
+
+class CopperAnimation:
+    def __init__(self, frame_buffer, coppers, scroll_speed=1, cycle_every=0):
+        self.frame_buffer = frame_buffer
+        self.coppers = coppers
+        # Líneas que avanzan las franjas por fotograma (negativo: hacia arriba)
+        self.scroll_speed = scroll_speed
+        # Fotogramas entre cada paso del ciclo de paleta (0 = sin ciclo)
+        self.cycle_every = cycle_every
+        # Primera línea de la imagen que ocupa la ventana de pantalla
+        self.screen_top = 0
+
+    def period(self):
+        # Fotogramas hasta que la animación vuelve a empezar
+        height = self.coppers.height
+        scroll = height // gcd(self.scroll_speed, height) if self.scroll_speed else 1
+        cycle = (PALETTE_SIZE - 1) * self.cycle_every if self.cycle_every else 1
+        return scroll * cycle // gcd(scroll, cycle)
+
+    def line_palettes(self, frame):
+        return np.roll(self.coppers.line_palette_table(), frame * self.scroll_speed)
+
+    def index_lut(self, frame):
+        # El índice 0 (color de fondo) no rota
+        lut = np.arange(256, dtype=np.uint8)
+        if self.cycle_every:
+            step = frame // self.cycle_every
+            lut[1:PALETTE_SIZE] = 1 + (np.arange(PALETTE_SIZE - 1) + step) % (PALETTE_SIZE - 1)
+        return lut
+
+    def render(self, frame):
+        frame_buffer = self.frame_buffer
+        indices = self.index_lut(frame)[frame_buffer.indices[self.screen_top:self.screen_top + self.coppers.height]]
+        return frame_buffer.palette_table.packed[self.line_palettes(frame)[:, None], indices]
+
+
+class CopperPlayback(QObject):
+    # Se emite con el fotograma RGB32 y su número dentro del bucle
+    frame_presented = pyqtSignal(object, int)
+
+    def __init__(self, animation, parent=None, rate=PAL_RATE, cache=None):
+        super().__init__(parent)
+        self.animation = animation
+        self.cache = cache if cache is not None else FrameCache(name="playback")
+        self.rate = rate
+        self.playing = False
+        self.start_time = 0.0
+        self.last_tick = -1
+        self.dropped_frames = 0
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+        # Cualquier cambio de paletas o Coppers deja obsoletos los fotogramas guardados
+        animation.frame_buffer.palette_table.listeners.append(self.invalidate)
+        animation.coppers.listeners.append(self.invalidate)
+
+    def invalidate(self, *args):
+        self.cache.clear()
+
+    def set_rate(self, rate):
+        self.rate = rate
+        if self.playing:
+            self.start()
+
+    def start(self):
+        self.playing = True
+        self.start_time = time.perf_counter()
+        self.last_tick = -1
+        self.dropped_frames = 0
+        self.timer.start(max(1, int(1000 / self.rate)))
+        self.tick()
+
+    def stop(self):
+        self.playing = False
+        self.timer.stop()
+
+    def tick(self):
+        # El fotograma que toca sale del reloj, no del número de disparos del temporizador
+        tick = int((time.perf_counter() - self.start_time) * self.rate)
+        if tick <= self.last_tick:
+            return
+        if self.last_tick >= 0 and tick > self.last_tick + 1:
+            self.dropped_frames += tick - self.last_tick - 1
+            render_stats.count("playback_dropped", tick - self.last_tick - 1)
+        self.last_tick = tick
+        frame_number = tick % self.animation.period()
+        self.frame_presented.emit(self.frame(frame_number), frame_number)
+
+    def frame(self, frame_number):
+        frame = self.cache.get(frame_number)
+        if frame is None:
+            with render_stats.stage("playback_frame"):
+                frame = self.animation.render(frame_number)
+            self.cache.put(frame_number, frame)
+        return frame
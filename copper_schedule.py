@@ -0,0 +1,88 @@
+#copper_schedule.py
+from bisect import bisect_left, bisect_right
+import numpy as np
+
+
+class CopperSchedule:
+    # Coppers ordenados por posición con la paleta de cada línea ya resuelta.
+    # Cada Copper manda desde su posición hasta la posición del siguiente.
+    def __init__(self, height, coppers=()):
+        self.height = height
+        self.coppers = []
+        self.positions = []
+        self.line_palettes = np.zeros(height, dtype=np.uint16)
+        # Funciones avisadas con (evento, fila): about_to_insert/inserted, about_to_remove/removed
+        self.listeners = []
+        for copper in coppers:
+            self.add(copper)
+
+    def __len__(self):
+        return len(self.coppers)
+
+    def __iter__(self):
+        return iter(self.coppers)
+
+    def __getitem__(self, index):
+        return self.coppers[index]
+
+    def index(self, copper):
+        return self.coppers.index(copper)
+
+    def add(self, copper):
+        index = bisect_right(self.positions, copper.position)
+        self.notify("about_to_insert", index)
+        self.positions.insert(index, copper.position)
+        self.coppers.insert(index, copper)
+        span = self.resolve(index)
+        self.notify("inserted", index)
+        return span
+
+    # Compatibilidad con el código que trataba los Coppers como una lista
+    append = add
+
+    def remove(self, copper):
+        index = self.coppers.index(copper)
+        self.notify("about_to_remove", index)
+        position = self.positions.pop(index)
+        self.coppers.pop(index)
+        if index > 0:
+            span = self.resolve(index - 1)
+        else:
+            # Sin Copper previo las líneas vuelven a la paleta de la imagen
+            span = (position, self.positions[0] if self.positions else self.height)
+            self.line_palettes[span[0]:span[1]] = 0
+        self.notify("removed", index)
+        return span
+
+    def move(self, copper, position):
+        old_start, old_stop = self.remove(copper)
+        copper.position = position
+        new_start, new_stop = self.add(copper)
+        return min(old_start, new_start), max(old_stop, new_stop)
+
+    def notify(self, event, index):
+        for listener in self.listeners:
+            listener(event, index)
+
+    def resolve(self, index):
+        # Reescribe solo las líneas que gobierna el Copper en la posición index
+        start = min(self.positions[index], self.height)
+        stop = self.positions[index + 1] if index + 1 < len(self.positions) else self.height
+        stop = min(stop, self.height)
+        self.line_palettes[start:stop] = self.coppers[index].palette_id
+        return start, stop
+
+    def copper_at(self, y):
+        # Copper vigente en la línea y, en O(log n)
+        index = bisect_right(self.positions, y) - 1
+        return self.coppers[index] if index >= 0 else None
+
+    def palette_at(self, y):
+        return int(self.line_palettes[y])
+
+    def coppers_between(self, start, stop):
+        return self.coppers[bisect_left(self.positions, start):bisect_left(self.positions, stop)]
+
+    def line_palette_table(self):
+        # Tabla completa de paleta efectiva por línea
+        return self.line_palettes
@@ -0,0 +1,229 @@
+#edit_history.py
+import time
+from collections import deque
+
+# Límite de memoria por defecto para el historial de deshacer
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+# Ediciones del mismo objetivo más seguidas que esto se funden en un solo paso
+DEFAULT_MERGE_WINDOW = 0.5
+
+EDIT_OVERHEAD_BYTES = 128
+
+
+class Edit:
+    # Una edición guarda solo el cambio: undo() y redo() cuestan lo que mide el cambio
+    def undo(self):
+        raise NotImplementedError
+
+    def redo(self):
+        raise NotImplementedError
+
+    def merge(self, other):
+        return False
+
+    def size(self):
+        return EDIT_OVERHEAD_BYTES
+
+
+class PaletteColorEdit(Edit):
+    def __init__(self, palette_table, palette_id, index, old_color, new_color):
+        self.palette_table = palette_table
+        self.palette_id = palette_id
+        self.index = index
+        self.old_color = old_color
+        self.new_color = new_color
+
+    def undo(self):
+        self.palette_table.set_color(self.palette_id, self.index, self.old_color)
+
+    def redo(self):
+        self.palette_table.set_color(self.palette_id, self.index, self.new_color)
+
+    def merge(self, other):
+        # Retoques seguidos del mismo color: se conserva el color original
+        if (isinstance(other, PaletteColorEdit) and other.palette_table is self.palette_table
+                and other.palette_id == self.palette_id and other.index == self.index):
+            self.new_color = other.new_color
+            return True
+        return False
+
+
+class CopperAddEdit(Edit):
+    def __init__(self, coppers, copper):
+        self.coppers = coppers
+        self.copper = copper
+
+    def undo(self):
+        return self.coppers.remove(self.copper)
+
+    def redo(self):
+        return self.coppers.add(self.copper)
+
+
+class CopperRemoveEdit(CopperAddEdit):
+    def undo(self):
+        return CopperAddEdit.redo(self)
+
+    def redo(self):
+        return CopperAddEdit.undo(self)
+
+
+class CopperPaletteEdit(Edit):
+    # new_source: archivo del que sale la paleta nueva; una paleta hecha a mano deja de vigilarse
+    def __init__(self, copper, old_palette, new_palette, new_source=None):
+        self.copper = copper
+        self.old_palette = old_palette
+        self.new_palette = new_palette
+        self.old_source = copper.source_path
+        self.new_source = new_source
+
+    def undo(self):
+        self.copper.palette = self.old_palette
+        self.copper.source_path = self.old_source
+
+    def redo(self):
+        self.copper.palette = self.new_palette
+        self.copper.source_path = self.new_source
+
+    def size(self):
+        return EDIT_OVERHEAD_BYTES + 2 * 3 * len(self.new_palette)
+
+
+class CopperMoveEdit(Edit):
+    def __init__(self, coppers, copper, old_position, new_position):
+        self.coppers = coppers
+        self.copper = copper
+        self.old_position = old_position
+        self.new_position = new_position
+
+    def undo(self):
+        return self.coppers.move(self.copper, self.old_position)
+
+    def redo(self):
+        return self.coppers.move(self.copper, self.new_position)
+
+    def merge(self, other):
+        # Arrastrar un Copper genera muchos movimientos: cuentan como uno
+        if isinstance(other, CopperMoveEdit) and other.copper is self.copper:
+            self.new_position = other.new_position
+            return True
+        return False
+
+
+class IndexEdit(Edit):
+    # Filas [start, start + n) de un buffer de índices (el del FrameBuffer u otro fotograma)
+    def __init__(self, frame_buffer, indices, start, old_rows, new_rows):
+        self.frame_buffer = frame_buffer
+        self.indices = indices
+        self.start = start
+        self.old_rows = old_rows
+        self.new_rows = new_rows
+
+    def apply(self, rows):
+        stop = self.start + len(rows)
+        self.indices[self.start:stop] = rows
+        # Los fotogramas inactivos se recomponen enteros al seleccionarlos
+        if self.indices is self.frame_buffer.indices:
+            self.frame_buffer.mark_lines_dirty(self.start, stop)
+        return self.start, stop
+
+    def undo(self):
+        return self.apply(self.old_rows)
+
+    def redo(self):
+        return self.apply(self.new_rows)
+
+    def size(self):
+        return EDIT_OVERHEAD_BYTES + self.old_rows.nbytes + self.new_rows.nbytes
+
+
+class CompoundEdit(Edit):
+    # Varias ediciones que se deshacen como un solo paso
+    def __init__(self, edits):
+        self.edits = list(edits)
+
+    def undo(self):
+        results = self.apply_all(list(reversed(self.edits)), "undo", "redo")
+        return results[-1]
+
+    def redo(self):
+        results = self.apply_all(self.edits, "redo", "undo")
+        return results[0]
+
+    @staticmethod
+    def apply_all(edits, step, rollback):
+        # Si una falla se revierten las ya aplicadas: la edición nunca queda a medias
+        results = []
+        try:
+            for edit in edits:
+                results.append(getattr(edit, step)())
+        except Exception:
+            for edit in reversed(edits[:len(results)]):
+                getattr(edit, rollback)()
+            raise
+        return results
+
+    def size(self):
+        return sum(edit.size() for edit in self.edits)
+
+
+class EditHistory:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, merge_window=DEFAULT_MERGE_WINDOW):
+        self.max_bytes = max_bytes
+        self.merge_window = merge_window
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.total_bytes = 0
+        self.last_push_time = None
+
+    def __len__(self):
+        return len(self.undo_stack)
+
+    def do(self, edit):
+        # Aplica la edición y la registra; devuelve lo que devuelva la edición
+        result = edit.redo()
+        self.push(edit)
+        return result
+
+    def push(self, edit):
+        now = time.monotonic()
+        self.redo_stack.clear()
+        last = self.undo_stack[-1] if self.undo_stack else None
+        recent = self.last_push_time is not None and now - self.last_push_time <= self.merge_window
+        self.last_push_time = now
+        if last is not None and recent:
+            old_size = last.size()
+            if last.merge(edit):
+                self.total_bytes += last.size() - old_size
+                return
+        self.undo_stack.append(edit)
+        self.total_bytes += edit.size()
+        # Se descartan las ediciones más antiguas hasta volver bajo el límite
+        while self.total_bytes > self.max_bytes and len(self.undo_stack) > 1:
+            self.total_bytes -= self.undo_stack.popleft().size()
+
+    def undo(self):
+        if not self.undo_stack:
+            return None
+        edit = self.undo_stack.pop()
+        self.total_bytes -= edit.size()
+        edit.undo()
+        self.redo_stack.append(edit)
+        self.last_push_time = None
+        return edit
+
+    def redo(self):
+        if not self.redo_stack:
+            return None
+        edit = self.redo_stack.pop()
+        edit.redo()
+        self.undo_stack.append(edit)
+        self.total_bytes += edit.size()
+        self.last_push_time = None
+        return edit
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.total_bytes = 0
+        self.last_push_time = None
@@ -0,0 +1,76 @@
+#frame_buffer.py
+import numpy as np
+
+from palette_table import PaletteTable
+
+
+class FrameBuffer:
+    def __init__(self, indices, palette_table, color_count=16):
+        # Buffer contiguo de índices (alto x ancho), un byte por píxel
+        self.indices = np.ascontiguousarray(indices, dtype=np.uint8)
+        self.height, self.width = self.indices.shape
+        # Índice de paleta de cada línea (0 = paleta de la imagen)
+        self.line_palettes = np.zeros(self.height, dtype=np.uint16)
+        # Tabla de paletas compartida con el editor de paleta y los Coppers
+        self.palette_table = palette_table
+        self.palette_table.listeners.append(self.mark_palette_dirty)
+        self.color_count = max(color_count, 1)
+        # Entradas de paleta que llegan a usarse (tamaño de la tabla de colores Indexed8)
+        self.index_count = max(self.color_count, int(self.indices.max(initial=0)) + 1)
+        # Líneas pendientes de redibujar. No hay buffer RGB32 de la imagen entera: el render compone
+        # solo la franja visible (frame_compose), así que la memoria sigue a la ventana y no a la altura
+        self.dirty = np.ones(self.height, dtype=bool)
+
+    @classmethod
+    def from_image(cls, image, palette_table=None):
+        if image.mode != "P":
+            raise ValueError("La imagen debe estar en modo indexado (P).")
+        raw_palette = image.getpalette() or []
+        palette = [tuple(raw_palette[i:i + 3]) for i in range(0, len(raw_palette), 3)]
+        if palette_table is None:
+            palette_table = PaletteTable()
+            palette_table.add(palette)
+        # np.array y no asarray: el array que presta PIL es de solo lectura y los índices se editan
+        return cls(np.array(image, dtype=np.uint8), palette_table, len(palette))
+
+    def set_indices(self, indices):
+        # Otro fotograma sobre las mismas paletas por línea: hay que recomponerlo entero
+        indices = np.ascontiguousarray(indices, dtype=np.uint8)
+        if indices.shape != self.indices.shape:
+            raise ValueError("El fotograma no tiene el tamaño del FrameBuffer.")
+        self.indices = indices
+        self.index_count = max(self.index_count, int(indices.max(initial=0)) + 1)
+        self.mark_lines_dirty()
+
+    def set_line_palette(self, y, palette_id):
+        if self.line_palettes[y] != palette_id:
+            self.line_palettes[y] = palette_id
+            self.dirty[y] = True
+
+    def set_line_palettes(self, start, palette_ids):
+        # Solo se marcan las líneas cuya paleta cambia realmente
+        palette_ids = np.asarray(palette_ids, dtype=self.line_palettes.dtype)
+        stop = start + len(palette_ids)
+        self.dirty[start:stop] |= self.line_palettes[start:stop] != palette_ids
+        self.line_palettes[start:stop] = palette_ids
+
+    def mark_lines_dirty(self, start=0, stop=None):
+        self.dirty[start:stop] = True
+
+    def mark_palette_dirty(self, palette_id):
+        self.dirty |= self.line_palettes == palette_id
+
+    def compose(self):
+        # Una sola indexación vectorizada: paleta de la línea x índice del píxel
+        return self.palette_table.colors[self.line_palettes[:, None], self.indices]
+
+    def to_image(self):
+        # PIL solo hace falta para exportar: importar el modelo no la carga
+        from PIL import Image
+        return Image.fromarray(self.compose(), "RGB")
+
+    def line_image(self, y):
+        from PIL import Image
+        line_image = Image.fromarray(self.indices[y:y + 1], "P")
+        line_image.putpalette(self.palette_table.colors[self.line_palettes[y]].tobytes())
+        return line_image
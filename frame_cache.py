@@ -0,0 +1,106 @@
+#frame_cache.py
+# Cachés de lo ya renderizado: franjas RGB32 compuestas y pixmaps escalados por zoom.
+# Las claves salen de un hash barato del contenido (píxeles de la línea y paleta efectiva), no
+# del historial: volver a un estado ya visto (deshacer, activar y desactivar el Copper, volver
+# a un zoom) encuentra el resultado guardado en lugar de recomponerlo.
+from collections import OrderedDict
+
+import numpy as np
+
+from render_stats import render_stats
+
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+# Las entradas mayores que esta fracción del límite no se guardan (ver put)
+MAX_ENTRY_FRACTION = 8
+HASH_SEED = 0x48535041
+# Pesos impares por columna: un solo valor distinto siempre cambia el hash de la fila
+hash_weights = {}
+
+
+def weights(count):
+    if count not in hash_weights:
+        rng = np.random.default_rng(HASH_SEED + count)
+        hash_weights[count] = rng.integers(0, 2 ** 63, count, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    return hash_weights[count]
+
+
+def row_hashes(rows):
+    # Un entero de 64 bits por fila (suma ponderada con desbordamiento), vectorizado. Las filas
+    # se leen como palabras de 64 bits siempre que se puede: ocho píxeles indexados por producto
+    if rows.shape[1] * rows.itemsize % 8 == 0:
+        words = np.ascontiguousarray(rows).view(np.uint64)
+    else:
+        words = rows.astype(np.uint64)
+    return (words * weights(words.shape[1])).sum(axis=1, dtype=np.uint64)
+
+
+def row_keys(indices, line_palettes, packed):
+    # Clave de cada línea: sus píxeles y la paleta con la que se ven
+    palette_hashes = row_hashes(packed)
+    return row_hashes(indices) ^ (palette_hashes[line_palettes] * weights(1)[0])
+
+
+def frame_key(keys, top):
+    return hash((top, keys.tobytes()))
+
+
+def nbytes(value):
+    return value.nbytes
+
+
+class FrameCache:
+    # LRU limitado en bytes; name (si se da) aparece en render_stats como <name>_hits / <name>_misses
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES, name=None, size=nbytes):
+        self.max_bytes = max_bytes
+        self.name = name
+        self.size = size
+        self.frames = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __contains__(self, key):
+        return key in self.frames
+
+    def count(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        if self.name:
+            render_stats.count(f"{self.name}_{'hits' if hit else 'misses'}")
+
+    def get(self, key):
+        frame = self.frames.get(key)
+        self.count(frame is not None)
+        if frame is not None:
+            self.frames.move_to_end(key)
+        return frame
+
+    def take(self, key):
+        # Como get, pero la entrada sale de la caché: para valores que se van a modificar
+        frame = self.frames.pop(key, None)
+        self.count(frame is not None)
+        if frame is not None:
+            self.total_bytes -= self.size(frame)
+        return frame
+
+    def put(self, key, frame):
+        if key in self.frames:
+            self.total_bytes -= self.size(self.frames.pop(key))
+        size = self.size(frame)
+        if size > self.max_bytes // MAX_ENTRY_FRACTION:
+            # Retener bloques enormes (pixmaps a mucho zoom) obliga a estrenar memoria en cada
+            # estado nuevo; cuesta más de lo que ahorra volver a ellos
+            return
+        self.frames[key] = frame
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes and len(self.frames) > 1:
+            self.total_bytes -= self.size(self.frames.popitem(last=False)[1])
+
+    def clear(self):
+        self.frames.clear()
+        self.total_bytes = 0
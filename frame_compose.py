@@ -0,0 +1,66 @@
+#frame_compose.py
+# Composición RGB32 de una franja de filas sin Qt: la usa el hilo de render del editor
+# (render_worker) y, en el hilo actual, los benchmarks, así que miden el mismo camino.
+import numpy as np
+
+from frame_cache import row_keys, frame_key
+from render_stats import render_stats
+
+
+class FrameSnapshot:
+    # Copia solo las filas sucias de la franja (índices y paletas de línea) y la tabla de paletas empaquetada
+    def __init__(self, frame_buffer, dirty, band):
+        top, bottom = band
+        self.band = band
+        edges = top + np.flatnonzero(np.diff(np.concatenate(([0], dirty[top:bottom].view(np.int8), [0]))))
+        self.spans = list(zip(edges[0::2].tolist(), edges[1::2].tolist()))
+        self.rows = [(frame_buffer.indices[start:stop].copy(), frame_buffer.line_palettes[start:stop].copy())
+                     for start, stop in self.spans]
+        self.packed = frame_buffer.palette_table.packed[:len(frame_buffer.palette_table)].copy()
+
+
+def compose_band(snapshot, base, base_top, base_keys, frame_cache, cancelled=None):
+    # Devuelve (fotograma, claves de fila, clave del fotograma), o None si cancelled() se cumple
+    # a medias. El fotograma anterior (base) no se toca: se copian las filas que comparte con la
+    # franja nueva y se recomponen solo las sucias
+    top, bottom = snapshot.band
+    first = max(top, base_top)
+    last = min(bottom, base_top + len(base))
+    with render_stats.stage("row_keys"):
+        keys = np.empty(bottom - top, dtype=np.uint64)
+        if first < last:
+            keys[first - top:last - top] = base_keys[first - base_top:last - base_top]
+        for (start, stop), (indices, line_palettes) in zip(snapshot.spans, snapshot.rows):
+            keys[start - top:stop - top] = row_keys(indices, line_palettes, snapshot.packed)
+        key = frame_key(keys, top)
+    frame = frame_cache.get(key)
+    if frame is None:
+        with render_stats.stage("compose"):
+            frame = np.empty((bottom - top, base.shape[1]), dtype=np.uint32)
+            if first < last:
+                frame[first - top:last - top] = base[first - base_top:last - base_top]
+            for (start, stop), (indices, line_palettes) in zip(snapshot.spans, snapshot.rows):
+                if cancelled is not None and cancelled():
+                    return None
+                frame[start - top:stop - top] = snapshot.packed[line_palettes[:, None], indices]
+        frame_cache.put(key, frame)
+    return frame, keys, key
+
+
+class BandCompositor:
+    # Lo que hace FrameRenderer, pero en el hilo actual y siempre con la imagen entera como franja
+    def __init__(self, frame_buffer, frame_cache):
+        self.frame_buffer = frame_buffer
+        self.frame_cache = frame_cache
+        self.front = np.zeros((0, frame_buffer.width), dtype=np.uint32)
+        self.front_keys = np.zeros(0, dtype=np.uint64)
+
+    def render(self):
+        # Recompone las líneas sucias y devuelve los tramos actualizados
+        frame_buffer = self.frame_buffer
+        dirty = frame_buffer.dirty.copy()
+        dirty[len(self.front):] = True
+        snapshot = FrameSnapshot(frame_buffer, dirty, (0, frame_buffer.height))
+        frame_buffer.dirty[:] = False
+        self.front, self.front_keys, _ = compose_band(snapshot, self.front, 0, self.front_keys, self.frame_cache)
+        return snapshot.spans
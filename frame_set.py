@@ -0,0 +1,85 @@
+#frame_set.py
+# Secuencia de fotogramas que comparten paletas, paleta por línea y Coppers. Cada fotograma
+# es solo un buffer de índices; el FrameBuffer del editor muestra el fotograma activo, así
+# que cualquier edición de paletas o Coppers vale para todos a la vez.
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+
+def indexed_frame(image, reference):
+    # Índices del fotograma sobre la paleta de la imagen de referencia (modo P); copia editable
+    if image.size != reference.size:
+        raise ValueError("Todos los fotogramas deben tener el mismo tamaño.")
+    if image.mode == "P" and image.getpalette() == reference.getpalette():
+        return np.array(image, dtype=np.uint8)
+    return np.array(image.convert("RGB").quantize(palette=reference, dither=Image.Dither.NONE), dtype=np.uint8)
+
+
+def compose_frame(indices, line_palettes, colors):
+    return colors[line_palettes[:, None], indices]
+
+
+class FrameSet:
+    def __init__(self, frame_buffer, frames=None, current=0, max_workers=None):
+        self.frame_buffer = frame_buffer
+        self.frames = list(frames) if frames else [frame_buffer.indices]
+        for frame in self.frames:
+            if frame.shape != frame_buffer.indices.shape:
+                raise ValueError("Todos los fotogramas deben tener el mismo tamaño.")
+        self.current = current
+        if self.frames[current] is not frame_buffer.indices:
+            frame_buffer.set_indices(self.frames[current])
+            self.frames[current] = frame_buffer.indices
+        self.max_workers = max_workers
+        self.executor = None
+
+    def __len__(self):
+        return len(self.frames)
+
+    def store_current(self):
+        # El buffer activo vuelve a su sitio (el FrameBuffer puede haberlo sustituido)
+        self.frames[self.current] = self.frame_buffer.indices
+
+    def select(self, index):
+        self.store_current()
+        self.current = index
+        self.frame_buffer.set_indices(self.frames[index])
+        self.frames[index] = self.frame_buffer.indices
+
+    def snapshot(self, step=1):
+        # Copia inmutable (submuestreada cada step píxeles) para componer fuera del hilo de la interfaz
+        self.store_current()
+        frame_buffer = self.frame_buffer
+        indices = [frame[::step, ::step].copy() for frame in self.frames]
+        line_palettes = frame_buffer.line_palettes[::step].copy()
+        packed = frame_buffer.palette_table.packed[:len(frame_buffer.palette_table)].copy()
+        return indices, line_palettes, packed
+
+    def render_all(self, step=1, snapshot=None):
+        # Un fotograma RGB32 por hilo; la indexación de numpy suelta el GIL mientras copia
+        indices, line_palettes, packed = snapshot or self.snapshot(step)
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return list(self.executor.map(lambda frame: compose_frame(frame, line_palettes, packed), indices))
+
+    def export(self, base_path):
+        # Un PNG por fotograma: base_000.png, base_001.png...
+        self.store_current()
+        colors = self.frame_buffer.palette_table.colors[:len(self.frame_buffer.palette_table)]
+        line_palettes = self.frame_buffer.line_palettes.copy()
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        def save(item):
+            number, frame = item
+            path = f"{base_path}_{number:03d}.png"
+            Image.fromarray(compose_frame(frame, line_palettes, colors), "RGB").save(path)
+            return path
+        return list(self.executor.map(save, enumerate(self.frames)))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
@@ -0,0 +1,174 @@
+#genesis_export.py
+# Exporta el horario de Coppers a tablas binarias para Mega Drive / Genesis:
+#  - tabla de escrituras en CRAM por interrupción horizontal (HInt)
+#  - valores de recarga del contador de HInt (registro 10 del VDP)
+# y estima cuántas palabras de CRAM tiene que transferir cada HBlank.
+#
+# Contrato con el código de la ROM que usa las tablas:
+#  - .cram: registros de escritura en orden de línea. Un registro de la línea 0 se escribe
+#    durante el VBlank; el resto, cada uno en su HInt, en orden.
+#  - .hint: cada byte es un intervalo (líneas hasta el siguiente HInt, menos uno). El VDP
+#    recarga el contador desde el registro 10 al vencer, antes de que corra el manejador, así
+#    que lo que escribe el HInt k vale para el intervalo siguiente al próximo. Por eso el VBlank
+#    deja el contador cargado con el byte 0 y el registro 10 con el byte 1 (el contador se
+#    recarga en cada línea del VBlank: el byte 1 se escribe tras la última recarga), y el HInt
+#    número k (desde 0) hace las escrituras de su registro y carga el byte k + 2.
+#    0xFF no vence dentro de la pantalla. hint_lines reproduce esta temporización.
+import struct
+from math import ceil
+
+import numpy as np
+
+PALETTE_SIZE = 16
+# Palabras de CRAM que caben en un HBlank por DMA (18 bytes por línea en H40, 16 en H32)
+HBLANK_CRAM_WORDS = {"H40": 9, "H32": 8}
+
+
+def rgb_to_cram(colors):
+    # Formato CRAM de 9 bits: ----BBB-GGG-RRR-
+    colors = np.asarray(colors, dtype=np.uint16).reshape(-1, 3) >> 5
+    return (colors[:, 2] << 9) | (colors[:, 1] << 5) | (colors[:, 0] << 1)
+
+
+def cram_to_rgb(words):
+    words = np.asarray(words, dtype=np.uint16)
+    channels = np.stack(((words >> 1) & 7, (words >> 5) & 7, (words >> 9) & 7), axis=-1)
+    return (channels * 36).astype(np.uint8)
+
+
+class CramWrite:
+    # Escrituras que una interrupción en la línea `line` debe hacer: lista de (dirección, valor)
+    def __init__(self, line, writes):
+        self.line = line
+        self.writes = writes
+
+    @property
+    def words(self):
+        return len(self.writes)
+
+
+def build_cram_writes(coppers, palette_line=0, only_changes=False):
+    # Cada Copper vuelca su paleta completa en la línea de paleta indicada (0-3). Con only_changes
+    # solo se escriben las entradas que difieren de lo que ya hay en CRAM; el primer Copper se
+    # escribe entero (no se sabe qué dejó el cuadro anterior) y los que no cambian nada se omiten.
+    base_address = palette_line * PALETTE_SIZE * 2
+    cram_writes = []
+    previous = None
+    for copper in coppers:
+        values = rgb_to_cram(copper.palette[:PALETTE_SIZE])
+        changed = range(len(values)) if previous is None or not only_changes else np.flatnonzero(values != previous)
+        previous = values
+        if len(changed) or not cram_writes:
+            writes = [(base_address + int(index) * 2, int(values[index])) for index in changed]
+            if cram_writes and cram_writes[-1].line == copper.position:
+                # Dos Coppers en la misma línea comparten su HInt; el último manda en cada dirección
+                writes = list(dict(cram_writes[-1].writes + writes).items())
+                cram_writes[-1].writes = writes
+            else:
+                cram_writes.append(CramWrite(copper.position, writes))
+    return cram_writes
+
+
+def hint_counters(cram_writes, screen_height):
+    # Intervalos del contador, uno por HInt: líneas desde el anterior (o desde el principio de
+    # la pantalla) menos uno. El registro de la línea 0 va en el VBlank y no necesita HInt
+    counters = []
+    previous = 0
+    for cram_write in cram_writes:
+        if 0 < cram_write.line < screen_height:
+            counters.append(cram_write.line - previous - 1)
+            previous = cram_write.line
+    return counters
+
+
+def hint_lines(table, screen_height):
+    # Líneas ante las que salta cada HInt con la tabla dada, recargando como el VDP: el contador
+    # baja una vez por línea y, al vencer, toma el registro 10 antes de que el manejador lo cambie
+    counter, register = table[0], table[1]
+    lines = []
+    for y in range(screen_height - 1):
+        if counter == 0:
+            counter = register
+            register = table[len(lines) + 2] if len(lines) + 2 < len(table) else 0xFF
+            lines.append(y + 1)
+        else:
+            counter -= 1
+    return lines
+
+
+def pack_cram_table(cram_writes):
+    # Big endian (68000): número de Coppers y, por cada uno, línea, número de escrituras y pares dirección/valor
+    data = bytearray(struct.pack(">H", len(cram_writes)))
+    for cram_write in cram_writes:
+        data += struct.pack(">HH", cram_write.line, cram_write.words)
+        for address, value in cram_write.writes:
+            data += struct.pack(">HH", address, value)
+    return bytes(data)
+
+
+def pack_hint_table(cram_writes, screen_height):
+    counters = hint_counters(cram_writes, screen_height)
+    # Dos 0xFF al final: el último HInt carga uno y el contador vence con el otro fuera de la pantalla
+    table = bytes(counters) + b"\xff\xff"
+    assert hint_lines(table, screen_height) == [cram_write.line for cram_write in cram_writes
+                                                if 0 < cram_write.line < screen_height]
+    return table
+
+
+def export_copper_tables(coppers, base_path, screen_height, palette_line=0, only_changes=True):
+    cram_writes = build_cram_writes(coppers, palette_line, only_changes)
+    with open(base_path + ".cram", "wb") as file:
+        file.write(pack_cram_table(cram_writes))
+    with open(base_path + ".hint", "wb") as file:
+        file.write(pack_hint_table(cram_writes, screen_height))
+    return cram_writes
+
+
+class ScanlineLoad:
+    def __init__(self, line, words, budget, lines_needed, lines_available):
+        self.line = line
+        self.words = words
+        self.budget = budget
+        self.lines_needed = lines_needed
+        self.lines_available = lines_available
+
+    @property
+    def over_budget(self):
+        # Más palabras de las que caben en un HBlank: se escribe con la pantalla activa (puntos de CRAM)
+        return self.words > self.budget
+
+    @property
+    def overrun(self):
+        # Las escrituras no terminan antes de la interrupción del siguiente Copper
+        return self.lines_needed > self.lines_available
+
+    def __str__(self):
+        status = "desborda" if self.overrun else ("excede el HBlank" if self.over_budget else "ok")
+        return f"Línea {self.line}: {self.words} palabras CRAM / {self.budget} por HBlank ({status})"
+
+
+def analyze_cram_load(cram_writes, screen_height, mode="H40"):
+    # Estima la carga de CRAM de cada interrupción frente al presupuesto por línea del modo de vídeo
+    budget = HBLANK_CRAM_WORDS[mode]
+    loads = []
+    for current, following in zip(cram_writes, cram_writes[1:] + [None]):
+        next_line = following.line if following is not None else screen_height
+        # Lo que se escribe para la línea 0 se vuelca durante el VBlank, sin límite práctico
+        line_budget = max(budget, current.words) if current.line == 0 else budget
+        loads.append(ScanlineLoad(current.line, current.words, line_budget,
+                                  ceil(current.words / line_budget), max(next_line - current.line, 0)))
+    return loads
+
+
+def scanline_words(cram_writes, screen_height, mode="H40"):
+    # Palabras transferidas en cada línea si las escrituras se reparten a ritmo de presupuesto
+    budget = HBLANK_CRAM_WORDS[mode]
+    words = np.zeros(screen_height, dtype=np.int32)
+    for cram_write in cram_writes:
+        remaining = cram_write.words
+        line = cram_write.line
+        while remaining > 0 and line < screen_height:
+            words[line] += min(remaining, budget)
+            remaining -= budget
+            line += 1
+    return words
@@ -1,50 +1,126 @@
 from PyQt5.QtWidgets import (
     QLabel, QVBoxLayout, QHBoxLayout, QColorDialog, QWidget,
-    QRadioButton, QGroupBox, QShortcut, QScrollArea, QMessageBox, QCheckBox, QPushButton, QSlider
+    QRadioButton, QGroupBox, QShortcut, QScrollArea, QMessageBox, QCheckBox, QPushButton, QSlider, QFileDialog,
+    QSpinBox, QApplication, QComboBox, QListWidget, QListWidgetItem, QListView
 )
-from PyQt5.QtGui import QPixmap, QImage, QColor, QKeySequence
-from PyQt5.QtCore import Qt, QEvent
+from PyQt5.QtGui import QImage, QColor, QKeySequence, QFontDatabase, QPixmap, QIcon
+from PyQt5.QtCore import Qt, QEvent, QTimer, QSize
 from PIL import Image
 from random import randint
-import sys
+import os
+import numpy as np
 
 from image_line import ImageLine
+from frame_buffer import FrameBuffer
+from palette_table import PaletteTable
+from quantizer import quantize_frames, band_positions
+from image_view import ImageView, wrap_array, visible_band
+from genesis_export import export_copper_tables, analyze_cram_load
+from copper_optimizer import optimize_coppers, permutation_edit
+from render_stats import render_stats
+from render_worker import FrameRenderer, ThumbnailRenderer
+from frame_cache import row_keys, frame_key
+from frame_set import FrameSet, indexed_frame
+from project_file import load_project, save_project, is_project_path, PROJECT_EXTENSION
+from copper_playback import CopperAnimation, CopperPlayback, PAL_RATE, NTSC_RATE
 from palette_editor import PaletteEditor
-from copper_effect_editor import Copper, CopperEffectEditor
-from new_copper_widget import NewCopperWidget
+from copper import Copper
+from copper_effect_editor import CopperEffectEditor
+from copper_schedule import CopperSchedule
+from edit_history import EditHistory, PaletteColorEdit, CopperMoveEdit, CopperPaletteEdit, IndexEdit, CompoundEdit
+from source_watcher import SourceWatcher, read_image, load_image_source, load_palette_source, changed_spans
 
 from color_picker_label import ColorPickerLabel  # Importamos la nueva clase
 
 DEFAULT_ZOOM_LEVEL = 1.0
 INTERRUPTION_SPACING = 32
 SCREEN_HEIGHT = 224
+DEFAULT_REFRESH_RATE = 60
 
 
 class ImageEditorWidget(QWidget):
-    def __init__(self, image_path):
+    def __init__(self, image_path, frame_paths=()):
         super().__init__()
 
         self.image_path = image_path
-        self.image = Image.open(image_path)
-        # Verificar que la imagen no exceda la altura de pantalla
-        if self.image.height > SCREEN_HEIGHT:
-            error_message = f"La imagen es demasiado grande. La altura máxima permitida es {SCREEN_HEIGHT} píxeles."
-            QMessageBox.warning(self, "Error", error_message)
-            sys.exit(1)
-
-        self.edit_history = []
-        self.coppers = []
+        # Un proyecto trae ya el FrameBuffer, los Coppers y el historial
+        self.project = load_project(image_path) if is_project_path(image_path) else None
+        if self.project is not None:
+            self.image_path = self.project.image_path
+            # Solo como referencia de la paleta al recargar los fotogramas; puede que ya no exista
+            self.image = read_image(self.image_path) if os.path.isfile(self.image_path) else None
+            frame_paths = self.project.frame_paths
+            self.frame_buffer = self.project.frame_buffer
+            self.coppers = self.project.coppers
+            self.edit_history = self.project.edit_history or EditHistory()
+            frames = self.project.frames
+        else:
+            self.image = Image.open(image_path)
+            # Resto de fotogramas de una animación: comparten paletas y Coppers con el primero
+            frame_images = [Image.open(path) for path in frame_paths]
+            if any(frame.size != self.image.size for frame in frame_images):
+                QMessageBox.warning(self, "Error", "Todos los fotogramas deben tener el mismo tamaño: "
+                                                   "se abre solo el primero.")
+                frame_images = []
+                frame_paths = ()
+            self.edit_history = EditHistory()
+            band_palettes, frames = self.load_frame_buffer(frame_images)
+            # Los Coppers se programan por línea de pantalla: en imágenes más altas que la pantalla
+            # gobiernan una ventana de SCREEN_HEIGHT líneas que se puede mover por la imagen
+            self.coppers = CopperSchedule(min(self.frame_buffer.height, SCREEN_HEIGHT))
+        self.frame_set = FrameSet(self.frame_buffer, frames, self.project.current_frame if self.project else 0)
+        self.frame_paths = list(frame_paths)
+        # Archivo de imagen de cada fotograma que se vigila: ruta -> número de fotograma
+        self.image_sources = {os.path.abspath(path): number
+                              for number, path in enumerate([self.image_path, *frame_paths]) if path}
+        self.screen_height = self.coppers.height
+        self.tall_image = self.frame_buffer.height > self.screen_height
         self.image_lines = []
         self.initialize_image_lines()
-        self.palette_editor = PaletteEditor(self.image_lines)
+        self.palette_editor = PaletteEditor(self.frame_buffer)
         self.initial_palette = [self.palette_editor.get_palette_color(i) for i in range(16)]
-        self.create_copper_zero()
-        self.new_copper_widget = None
-        self.image_label = QLabel(self)
-        self.image_label.setPixmap(QPixmap.fromImage(self.convert_pil_to_qimage(self.get_combined_image())))
+        if self.project is None:
+            self.create_copper_zero()
+            self.create_band_coppers(band_palettes[1:])
+        # La imagen mostrada envuelve la memoria del FrameBuffer sin copiarla; solo la franja visible
+        self.display_format = None
+        self.display_band = None
+        # La composición RGB32 se hace en un hilo aparte; solo se muestran fotogramas terminados
+        self.frame_renderer = FrameRenderer(self.frame_buffer, self)
+        self.frame_renderer.frame_shown.connect(self.show_rendered_frame)
+        # Reproducción animada: desplazamiento de las franjas y ciclo de paleta a 50/60 Hz
+        self.copper_playback = CopperPlayback(CopperAnimation(self.frame_buffer, self.coppers), self)
+        self.copper_playback.frame_presented.connect(self.show_playback_frame)
+        self.playback_frame = None
+        # Vista previa del selector de color: como mucho un redibujado por refresco de pantalla
+        self.preview_index = None
+        self.preview_color = None
+        self.preview_original = None
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.timeout.connect(self.apply_color_preview)
+        self.image_label = ImageView(self)
         self.scroll_area = QScrollArea(self)
         self.scroll_area.setWidgetResizable(True)
         self.scroll_area.setWidget(self.image_label)
+        self.image_label.set_content_size(self.frame_buffer.width, self.frame_buffer.height)
+        # Tira de miniaturas de los fotogramas; se recompone en segundo plano tras cada edición
+        self.thumbnail_strip = QListWidget(self)
+        self.thumbnail_strip.setViewMode(QListView.IconMode)
+        self.thumbnail_strip.setFlow(QListView.LeftToRight)
+        self.thumbnail_strip.setWrapping(False)
+        self.thumbnail_renderer = ThumbnailRenderer(self.frame_set, parent=self)
+        step = self.thumbnail_renderer.step
+        thumbnail_size = QSize(-(-self.frame_buffer.width // step), -(-self.frame_buffer.height // step))
+        self.thumbnail_strip.setIconSize(thumbnail_size)
+        self.thumbnail_strip.setFixedHeight(thumbnail_size.height() + 48)
+        for number in range(len(self.frame_set)):
+            self.thumbnail_strip.addItem(QListWidgetItem(f"Fotograma {number + 1}"))
+        self.thumbnail_strip.setCurrentRow(self.frame_set.current)
+        self.thumbnail_strip.currentRowChanged.connect(self.select_frame)
+        self.thumbnail_strip.setVisible(len(self.frame_set) > 1)
+        self.thumbnail_renderer.thumbnails_shown.connect(self.show_thumbnails)
+        self.scroll_area.verticalScrollBar().valueChanged.connect(self.update_viewport)
         color_group_box = QGroupBox("Paleta de Colores")
         color_layout = QHBoxLayout(color_group_box)
         color_layout.setContentsMargins(0, 0, 0, 0)
@@ -74,19 +150,25 @@ class ImageEditorWidget(QWidget):
         self.set_zoom_level(DEFAULT_ZOOM_LEVEL)
         undo_shortcut = QShortcut(QKeySequence("Ctrl+Z"), self)
         undo_shortcut.activated.connect(self.undo_last_change)
+        for sequence in ("Ctrl+Y", "Ctrl+Shift+Z"):
+            redo_shortcut = QShortcut(QKeySequence(sequence), self)
+            redo_shortcut.activated.connect(self.redo_last_change)
         main_layout = QVBoxLayout(self)
         main_layout_splitter = QHBoxLayout()
         main_layout_splitter.addWidget(self.scroll_area)
         side_panel = QWidget(self)
         side_panel.setFixedWidth(400)
-        # Agregar el QScrollArea para los NewCopperWidget
-        self.scroll_area_coppers = QScrollArea(self)
-        self.scroll_area_coppers.setWidgetResizable(True)
-        self.scroll_area_coppers.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
-        self.scroll_area_coppers.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        self.scroll_area_coppers_widget = QWidget()
-        self.scroll_area_coppers_layout = QVBoxLayout(self.scroll_area_coppers_widget)
-        self.scroll_area_coppers.setWidget(self.scroll_area_coppers_widget)
+        # Línea del nuevo Copper; el NewCopperWidget se crea solo al usarlo
+        new_copper_layout = QHBoxLayout()
+        self.new_copper_position = QSpinBox(self)
+        self.new_copper_position.setRange(0, self.screen_height - 1)
+        self.new_copper_position.setSingleStep(INTERRUPTION_SPACING)
+        self.new_copper_position.setPrefix("Línea ")
+        new_copper_button = QPushButton("Nuevo Copper", self)
+        new_copper_button.clicked.connect(
+            lambda: self.copper_effect_editor.launch_new_copper_widget(self.new_copper_position.value()))
+        new_copper_layout.addWidget(self.new_copper_position)
+        new_copper_layout.addWidget(new_copper_button)
         self.side_layout = QVBoxLayout(side_panel)
         self.x_position_label = QLabel(self)
         self.side_layout.addWidget(self.x_position_label)
@@ -96,40 +178,140 @@ class ImageEditorWidget(QWidget):
         self.side_layout.addWidget(self.slider_position_label)
         self.copper_status_label = QLabel(self)
         self.side_layout.addWidget(self.copper_status_label)
-        self.side_layout.addWidget(self.scroll_area_coppers)
+        self.side_layout.addLayout(new_copper_layout)
+        # Ventana de pantalla: primera línea de la imagen que ve la consola
+        self.screen_top_spinbox = QSpinBox(self)
+        self.screen_top_spinbox.setRange(0, self.frame_buffer.height - self.screen_height)
+        self.screen_top_spinbox.setPrefix("Ventana de pantalla desde la línea ")
+        self.screen_top_spinbox.valueChanged.connect(self.move_screen_window)
+        self.screen_top_spinbox.setVisible(self.tall_image)
+        self.side_layout.addWidget(self.screen_top_spinbox)
+        if self.tall_image:
+            self.image_label.set_screen_window((0, self.screen_height))
         self.initial_palette_group = QGroupBox("Paleta Inicial")
         self.initial_color_layout = QHBoxLayout(self.initial_palette_group)
         for i, color in enumerate(self.initial_palette):
             color_label = ColorPickerLabel(color, self)  # Usamos la nueva clase
             self.initial_color_layout.addWidget(color_label)
         self.side_layout.addWidget(self.initial_palette_group)
+        playback_group = QGroupBox("Reproducción")
+        playback_layout = QVBoxLayout(playback_group)
+        playback_controls = QHBoxLayout()
+        self.playback_rate = QComboBox(self)
+        self.playback_rate.addItem("50 Hz (PAL)", PAL_RATE)
+        self.playback_rate.addItem("60 Hz (NTSC)", NTSC_RATE)
+        self.playback_rate.currentIndexChanged.connect(
+            lambda _: self.copper_playback.set_rate(self.playback_rate.currentData()))
+        self.playback_scroll = QSpinBox(self)
+        self.playback_scroll.setRange(-16, 16)
+        self.playback_scroll.setValue(1)
+        self.playback_scroll.setSuffix(" lín/fot")
+        self.playback_scroll.valueChanged.connect(self.update_playback_animation)
+        self.playback_cycle = QSpinBox(self)
+        self.playback_cycle.setRange(0, 60)
+        self.playback_cycle.setPrefix("Ciclo cada ")
+        self.playback_cycle.setSpecialValueText("Sin ciclo")
+        self.playback_cycle.valueChanged.connect(self.update_playback_animation)
+        self.playback_button = QPushButton("Reproducir", self)
+        self.playback_button.setCheckable(True)
+        self.playback_button.toggled.connect(self.toggle_playback)
+        playback_controls.addWidget(self.playback_rate)
+        playback_controls.addWidget(self.playback_scroll)
+        playback_controls.addWidget(self.playback_cycle)
+        playback_controls.addWidget(self.playback_button)
+        playback_layout.addLayout(playback_controls)
+        self.playback_status_label = QLabel(self)
+        playback_layout.addWidget(self.playback_status_label)
+        self.side_layout.addWidget(playback_group)
+        export_button = QPushButton("Exportar tablas CRAM/HInt", self)
+        export_button.clicked.connect(self.export_genesis_tables)
+        self.side_layout.addWidget(export_button)
+
+        optimize_button = QPushButton("Optimizar escrituras CRAM", self)
+        optimize_button.clicked.connect(self.optimize_cram_writes)
+        self.side_layout.addWidget(optimize_button)
+        export_frames_button = QPushButton("Exportar fotogramas...", self)
+        export_frames_button.clicked.connect(self.export_frames)
+        export_frames_button.setVisible(len(self.frame_set) > 1)
+        self.side_layout.addWidget(export_frames_button)
+        save_project_button = QPushButton("Guardar proyecto...", self)
+        save_project_button.clicked.connect(self.save_project_file)
+        self.side_layout.addWidget(save_project_button)
+        self.reload_status_label = QLabel(self)
+        self.reload_status_label.setWordWrap(True)
+        self.side_layout.addWidget(self.reload_status_label)
+        # Tiempos por etapa del render; sin activar no se mide nada
+        self.stats_checkbox = QCheckBox("Mostrar tiempos de render", self)
+        self.stats_checkbox.stateChanged.connect(self.toggle_render_stats)
+        self.side_layout.addWidget(self.stats_checkbox)
+        self.stats_label = QLabel(self)
+        self.stats_label.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self.stats_label.hide()
+        self.side_layout.addWidget(self.stats_label)
+        self.stats_dump_button = QPushButton("Guardar tiempos...", self)
+        self.stats_dump_button.clicked.connect(self.dump_render_stats)
+        self.stats_dump_button.hide()
+        self.side_layout.addWidget(self.stats_dump_button)
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setInterval(500)
+        self.stats_timer.timeout.connect(self.refresh_render_stats)
         main_layout_splitter.addWidget(side_panel)
         main_layout.addLayout(main_layout_splitter)
+        main_layout.addWidget(self.thumbnail_strip)
         main_layout.addWidget(color_group_box)
         main_layout.addWidget(zoom_group_box)
         main_layout.addWidget(self.copper_checkbox)
         main_layout.addWidget(raster_group_box)
         self.scroll_area.installEventFilter(self)
+        self.scroll_area.viewport().installEventFilter(self)
         self.copper_buttons = []
-        self.initialize_copper_buttons()
         self.copper_effect_editor = CopperEffectEditor(
+            self.frame_buffer,
             self.image_lines,
             self.coppers,
             self.side_layout,
             self.edit_history,
             self.copper_status_label,
-            sender_button=None  # No se necesita el botón en este punto
+            sender_button=None,  # No se necesita el botón en este punto
+            on_coppers_changed=self.refresh_after_history_change,
+            frame_set=self.frame_set
         )
-
-    def initialize_copper_buttons(self):
-        for i in range(1, SCREEN_HEIGHT // INTERRUPTION_SPACING + 1):
-            new_copper_widget = NewCopperWidget(self.get_previous_copper_palette(), parent=self)
-            new_copper_widget.accepted.connect(self.on_new_copper_widget_accepted)
-            self.scroll_area_coppers_layout.addWidget(new_copper_widget)
-
-        # Conectar cada botón a la función apply_copper_effect_for_button
-        for button in self.copper_buttons:
-            button.clicked.connect(self.apply_copper_effect_for_button)
+        # Recarga en caliente: la imagen y las paletas de los Coppers se releen al cambiar en disco
+        self.source_watcher = SourceWatcher(self)
+        self.source_watcher.source_changed.connect(self.reload_source)
+        self.source_watcher.source_loaded.connect(self.apply_reloaded_source)
+        self.source_watcher.source_failed.connect(
+            lambda path, error: self.reload_status_label.setText(
+                f"No se pudo recargar {os.path.basename(path)}: {error}"))
+        self.update_watched_sources()
+        if self.project is not None:
+            self.screen_top_spinbox.setValue(self.project.screen_top)
+            self.copper_checkbox.setChecked(self.project.copper_effect)
+        elif len(self.coppers) > 1:
+            # Imagen cuantizada por franjas: se muestra ya con sus Coppers
+            self.copper_checkbox.setChecked(True)
+
+    def load_frame_buffer(self, frame_images=()):
+        # Devuelve las paletas por franja y los buffers de índices de todos los fotogramas
+        if self.image.mode == "P":
+            self.frame_buffer = FrameBuffer.from_image(self.image)
+            return [], [self.frame_buffer.indices] + [indexed_frame(frame, self.image) for frame in frame_images]
+        # Imagen truecolor: una paleta Genesis de 16 colores por franja de Coppers. Las franjas van
+        # atadas a líneas de pantalla, así que una imagen más alta que la pantalla usa una sola paleta
+        if self.image.height > SCREEN_HEIGHT:
+            positions = [0]
+        else:
+            positions = band_positions(self.image.height, INTERRUPTION_SPACING)
+        frames, band_palettes = quantize_frames([self.image, *frame_images], positions)
+        palette_table = PaletteTable()
+        palette_table.add(band_palettes[0][1])
+        self.frame_buffer = FrameBuffer(frames[0], palette_table)
+        return band_palettes, [self.frame_buffer.indices] + frames[1:]
+
+    def create_band_coppers(self, band_palettes):
+        palette_table = self.frame_buffer.palette_table
+        for position, palette in band_palettes:
+            self.coppers.add(Copper(position=position, palette_id=palette_table.add(palette), palette_table=palette_table))
 
     def apply_copper_effect_for_button(self):
         # Obtener el índice del botón que se ha presionado
@@ -139,26 +321,19 @@ class ImageEditorWidget(QWidget):
         current_palette = [self.palette_editor.get_palette_color(i) for i in range(16)]
         self.copper_effect_editor.apply_copper_effect(current_palette, button_index)
 
-    def get_previous_copper_palette(self):
-        if len(self.coppers) > 1:
-            return self.coppers[-2].palette
-        else:
-            return [0] * 16
-
     def add_copper_instance(self, position):
         # Crear Copper en la posición especificada
         self.copper_effect_editor.add_copper_instance(position)
 
     def create_copper_zero(self):
         # Creamos el Copper cero con la paleta de la imagen cargada
-        copper_zero_palette = [self.palette_editor.get_palette_color(i) for i in range(16)]
-        self.coppers.append(Copper(position=0, palette=copper_zero_palette))
+        # Comparte la paleta 0 de la tabla, que es la de la imagen cargada
+        self.coppers.append(Copper(position=0, palette_id=0, palette_table=self.frame_buffer.palette_table))
 
     def initialize_image_lines(self):
-        for i in range(self.image.height):
-            line_image = self.image.crop((0, i, self.image.width, i + 1))
-            palette_index = i % 16
-            self.image_lines.append(ImageLine(line_image, palette_index))
+        # Cada ImageLine es una vista sobre el FrameBuffer compartido
+        for i in range(self.frame_buffer.height):
+            self.image_lines.append(ImageLine(self.frame_buffer, i))
 
     def toggle_copper_effect(self, state):
         effect_enabled = state == Qt.Checked
@@ -179,74 +354,254 @@ class ImageEditorWidget(QWidget):
                 button.show()
 
 
-    def convert_pil_to_qimage(self, pil_image):
-        image = pil_image.convert("RGBA")
-        width, height = image.size
-        bytes_per_line = 4 * width
-        q_image = QImage(image.tobytes("raw", "RGBA"), width, height, bytes_per_line, QImage.Format_RGBA8888)
-        return q_image
-
     def set_zoom_level(self, level):
-        self.edit_history.append(self.get_current_state())
-        new_size = (self.image.width, int(self.image.height * level))
-        for image_line in self.image_lines:
-            image_line.image = image_line.image.resize(new_size)
-        self.update_image_with_current_zoom()
+        # El zoom es solo una transformación de la vista: no toca los píxeles ni el historial
+        if self.display_format is None:
+            self.update_image_with_current_zoom()
+        self.image_label.set_zoom(level)
+        self.update_viewport()
 
-    def get_current_state(self):
-        return {
-            'palettes': {y: image_line.palette_index for y, image_line in enumerate(self.image_lines)},
-            'zoom_level': self.get_current_zoom_level(),
-        }
+    def get_current_zoom_level(self):
+        for i, radio_button in enumerate(self.zoom_radio_buttons):
+            if radio_button.isChecked():
+                return float(radio_button.text().replace('x', ''))
 
-    def launch_new_copper_widget(self, position):
-        if not self.new_copper_widget:
-            self.new_copper_widget = NewCopperWidget(self.get_previous_palette(), parent=self)
+    def update_image_with_current_zoom(self):
+        self.image_label.set_zoom(self.get_current_zoom_level())
+        if self.copper_playback.playing:
+            # La reproducción pinta sus propios fotogramas; al pararla se redibuja todo
+            return
+        band = self.visible_band()
+        if self.frame_buffer.line_palettes.any():
+            # Varias paletas en pantalla: RGB32 compuesto en segundo plano, solo las líneas sucias de la franja
+            self.frame_renderer.set_band(*band)
+            self.frame_renderer.request()
+        else:
+            # Una sola paleta: Indexed8 sobre el buffer de índices, basta con reescribir la tabla de colores
+            self.frame_renderer.cancel()
+            top, bottom = band
+            if self.display_format != QImage.Format_Indexed8 or self.display_band != band:
+                self.display_format = QImage.Format_Indexed8
+                self.display_band = band
+                self.image_label.set_image(wrap_array(self.frame_buffer.indices[top:bottom], QImage.Format_Indexed8),
+                                           top)
+            with render_stats.stage("row_keys"):
+                # Todas las líneas están en la paleta 0: la misma clave que tendría la franja compuesta en RGB32
+                keys = row_keys(self.frame_buffer.indices[top:bottom], self.frame_buffer.line_palettes[top:bottom],
+                                self.frame_buffer.palette_table.packed[:1])
+                key = frame_key(keys, top)
+            with render_stats.stage("color_table"):
+                color_table = self.frame_buffer.palette_table.packed[0, :self.frame_buffer.index_count]
+                self.image_label.image.setColorTable(color_table.tolist())
+                self.image_label.invalidate(key)
+        if len(self.frame_set) > 1:
+            self.thumbnail_renderer.request()
+
+    def select_frame(self, index):
+        # Mismas paletas y Coppers, otro buffer de índices: se vuelve a envolver y componer la vista
+        if index < 0 or index == self.frame_set.current:
+            return
+        self.frame_set.select(index)
+        self.copper_playback.invalidate()
+        self.display_format = None
+        self.display_band = None
+        self.update_image_with_current_zoom()
 
-        # Conectar el slot del widget para actualizar la lista y paletas cuando se acepta
-        self.new_copper_widget.accepted.connect(lambda: self.on_new_copper_widget_accepted(position))
+    def show_thumbnails(self, thumbnails):
+        for number, thumbnail in enumerate(thumbnails):
+            # copy(): el pixmap no debe depender del array del hilo de trabajo
+            image = wrap_array(thumbnail, QImage.Format_RGB32).copy()
+            self.thumbnail_strip.item(number).setIcon(QIcon(QPixmap.fromImage(image)))
 
-        # Mostrar el widget
-        self.new_copper_widget.show()
+    def export_frames(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Exportar fotogramas", "", "PNG (*.png)")
+        if file_path:
+            self.frame_set.export(os.path.splitext(file_path)[0])
 
-    def on_new_copper_widget_accepted(self, position):
-        new_palette = self.new_copper_widget.get_selected_palette()
-        new_copper = Copper(position=position, palette=new_palette)
-        self.coppers.append(new_copper)
+    def visible_band(self):
+        return visible_band(self.scroll_area.verticalScrollBar().value(), self.scroll_area.viewport().height(),
+                            self.image_label.zoom, self.frame_buffer.height)
 
-        self.show_copper_palettes()
-        self.update_copper_list_widget()
+    def update_viewport(self, _=None):
+        # Al desplazar o cambiar de zoom solo se compone la franja nueva si cambia de bloque
+        if self.visible_band() != self.display_band:
+            self.update_image_with_current_zoom()
 
-        palette_text = self.get_palette_text_from_widget()
-        print(f"Nueva paleta seleccionada: {palette_text}")
+    def show_rendered_frame(self, frame, top, spans, key):
+        # El fotograma terminado sustituye al anterior; la vista se queda con el array vivo
+        if self.copper_playback.playing:
+            return
+        image = wrap_array(frame, QImage.Format_RGB32)
+        band = (top, top + len(frame))
+        if self.display_format != QImage.Format_RGB32 or self.display_band != band:
+            self.display_format = QImage.Format_RGB32
+            self.display_band = band
+            self.image_label.set_image(image, top, key)
+        else:
+            with render_stats.stage("upload_rows"):
+                self.image_label.replace_image(image, spans, key)
+
+    def move_screen_window(self, top):
+        # Las líneas que salen de la ventana vuelven a la paleta de la imagen
+        self.frame_buffer.set_line_palettes(self.copper_effect_editor.screen_top, [0] * self.screen_height)
+        self.copper_effect_editor.screen_top = top
+        self.copper_playback.animation.screen_top = top
+        self.copper_playback.invalidate()
+        self.image_label.set_screen_window((top, top + self.screen_height) if self.tall_image else None)
+        if self.copper_checkbox.isChecked():
+            self.copper_effect_editor.apply_copper_effect(self.initial_palette)
+        self.update_image_with_current_zoom()
 
+    def update_playback_animation(self, _=None):
+        self.copper_playback.animation.scroll_speed = self.playback_scroll.value()
+        self.copper_playback.animation.cycle_every = self.playback_cycle.value()
+        self.copper_playback.invalidate()
 
-    def get_current_zoom_level(self):
-        for i, radio_button in enumerate(self.zoom_radio_buttons):
-            if radio_button.isChecked():
-                return float(radio_button.text().replace('x', ''))
+    def toggle_playback(self, playing):
+        if playing:
+            self.playback_button.setText("Parar")
+            self.update_playback_animation()
+            self.copper_playback.start()
+        else:
+            self.playback_button.setText("Reproducir")
+            self.copper_playback.stop()
+            # Vuelve al fotograma estático del editor
+            self.display_format = None
+            self.display_band = None
+            self.frame_buffer.mark_lines_dirty()
+            self.update_image_with_current_zoom()
 
-    def update_image_with_current_zoom(self):
-        current_zoom = self.get_current_zoom_level()
-        combined_image = self.get_combined_image()
-        new_size = (int(combined_image.width * current_zoom), int(combined_image.height * current_zoom))
-        self.image_label.setPixmap(QPixmap.fromImage(self.convert_pil_to_qimage(combined_image.resize(new_size))))
+    def show_playback_frame(self, frame, frame_number):
+        # Cada fotograma es un array distinto: la vista lo envuelve mientras siga en pantalla
+        self.playback_frame = frame
+        self.image_label.set_image(wrap_array(frame, QImage.Format_RGB32), self.copper_playback.animation.screen_top)
+        cache = self.copper_playback.cache
+        self.playback_status_label.setText(
+            f"Fotograma {frame_number + 1}/{self.copper_playback.animation.period()} - "
+            f"perdidos: {self.copper_playback.dropped_frames} - "
+            f"caché: {len(cache)} fotogramas ({cache.hits} aciertos, {cache.misses} fallos)")
 
     def undo_last_change(self):
-        if self.edit_history:
-            last_state = self.edit_history.pop()
-            for y, palette_index in last_state['palettes'].items():
-                self.image_lines[y].palette_index = palette_index
-            self.update_image_with_current_zoom()
+        if self.edit_history.undo():
+            self.refresh_after_history_change()
+
+    def redo_last_change(self):
+        if self.edit_history.redo():
+            self.refresh_after_history_change()
+
+    def refresh_after_history_change(self):
+        # Las ediciones ya han tocado la tabla de paletas, el CopperSchedule o los píxeles: queda reflejarlo
+        self.copper_playback.invalidate()
+        self.update_watched_sources()
+        for i in range(16):
+            self.update_color_label(i)
+        if self.copper_checkbox.isChecked():
+            self.copper_effect_editor.apply_copper_effect(self.initial_palette)
+        self.update_image_with_current_zoom()
+
+    def update_watched_sources(self):
+        # Las paletas vigiladas son las de los Coppers del horario (deshacer puede quitar o devolver alguno)
+        copper_sources = [copper.source_path for copper in self.coppers if copper.source_path]
+        self.source_watcher.watch(list(self.image_sources) + copper_sources)
+
+    def reload_source(self, path):
+        if path not in self.image_sources:
+            self.source_watcher.load(path, load_palette_source)
+            return
+        # Paleta con la que se ve cada línea según los Coppers; la conversión va en segundo plano
+        line_palettes = np.zeros_like(self.frame_buffer.line_palettes)
+        top = self.copper_effect_editor.screen_top
+        line_palettes[top:top + self.screen_height] = self.coppers.line_palette_table()
+        table = self.frame_buffer.palette_table
+        palettes = {palette_id: table.get_palette(palette_id) for palette_id in np.unique(line_palettes).tolist()}
+        number = self.image_sources[path]
+        reference = self.image if number else None
+        self.source_watcher.load(path, load_image_source, line_palettes, palettes, reference, number == 0)
+
+    def apply_reloaded_source(self, path, result):
+        # Una sola edición deshacible con las filas y los Coppers que cambian; las posiciones no se tocan
+        if path in self.image_sources:
+            edits, summary = self.image_reload_edits(path, *result)
+        else:
+            edits, summary = self.palette_reload_edits(path, result)
+        if edits:
+            self.edit_history.do(CompoundEdit(edits))
+            self.refresh_after_history_change()
+        self.reload_status_label.setText(f"{os.path.basename(path)} recargado: {summary}")
+
+    def image_reload_edits(self, path, indices, palette, image):
+        number = self.image_sources[path]
+        self.frame_set.store_current()
+        frame = self.frame_set.frames[number]
+        if indices.shape != frame.shape:
+            return [], "ha cambiado de tamaño, no se aplica"
+        spans = changed_spans(frame, indices)
+        edits = [IndexEdit(self.frame_buffer, frame, start, frame[start:stop].copy(), indices[start:stop].copy())
+                 for start, stop in spans]
+        self.frame_buffer.index_count = max(self.frame_buffer.index_count, int(indices.max(initial=0)) + 1)
+        color_count = 0
+        if palette is not None:
+            table = self.frame_buffer.palette_table
+            old_palette = table.get_palette(0, len(palette))
+            edits += [PaletteColorEdit(table, 0, index, old_color, new_color)
+                      for index, (old_color, new_color) in enumerate(zip(old_palette, palette))
+                      if old_color != new_color]
+            color_count = len(edits) - len(spans)
+        if number == 0 and self.image is not None:
+            # Referencia de la paleta para los demás fotogramas
+            self.image = image
+        line_count = sum(stop - start for start, stop in spans)
+        return edits, f"{line_count} líneas y {color_count} colores de la paleta"
+
+    def palette_reload_edits(self, path, palette):
+        edits = [CopperPaletteEdit(copper, copper.palette, palette, copper.source_path) for copper in self.coppers
+                 if copper.source_path and os.path.abspath(copper.source_path) == path and copper.palette != palette]
+        return edits, f"{len(edits)} Coppers"
 
     def show_color_picker(self, event, index):
-        color = QColorDialog.getColor(QColor(*self.palette_editor.get_palette_color(index)), self)
-        if color.isValid():
+        # Diálogo no modal: la imagen sigue el color mientras se arrastra y solo se registra al aceptar
+        if self.preview_index is not None:
+            return
+        old_color = self.palette_editor.get_palette_color(index)
+        self.preview_index = index
+        self.preview_original = old_color
+        self.preview_color = None
+        screen = QApplication.primaryScreen()
+        refresh_rate = screen.refreshRate() if screen else 0
+        self.preview_timer.setInterval(int(1000 / (refresh_rate or DEFAULT_REFRESH_RATE)))
+        dialog = QColorDialog(QColor(*old_color), self)
+        dialog.setAttribute(Qt.WA_DeleteOnClose)
+        dialog.currentColorChanged.connect(self.queue_color_preview)
+        dialog.accepted.connect(lambda: self.finish_color_preview(dialog.currentColor()))
+        dialog.rejected.connect(lambda: self.finish_color_preview(None))
+        dialog.open()
+
+    def queue_color_preview(self, color):
+        self.preview_color = (color.red(), color.green(), color.blue())
+        if not self.preview_timer.isActive():
+            self.preview_timer.start()
+
+    def apply_color_preview(self):
+        # Solo cambia una entrada de la paleta: las líneas que la usan se marcan sucias
+        if self.preview_index is None or self.preview_color is None:
+            return
+        self.frame_buffer.palette_table.set_color(0, self.preview_index, self.preview_color)
+        self.update_color_label(self.preview_index)
+        self.update_image_with_current_zoom()
+
+    def finish_color_preview(self, color):
+        self.preview_timer.stop()
+        index, old_color = self.preview_index, self.preview_original
+        self.preview_index = None
+        table = self.frame_buffer.palette_table
+        # Se vuelve al color original y, si se acepta, se aplica como una sola edición del historial
+        table.set_color(0, index, old_color)
+        if color is not None and color.isValid():
             new_color = (color.red(), color.green(), color.blue())
-            self.edit_history.append(self.get_current_state())
-            self.palette_editor.change_palette_color_at_index(index, new_color)
-            self.update_color_label(index)
-            self.update_image_with_current_zoom()
+            if new_color != old_color:
+                self.edit_history.do(PaletteColorEdit(table, 0, index, old_color, new_color))
+        self.update_color_label(index)
+        self.update_image_with_current_zoom()
 
     def change_palette(self, new_palette):
         for i in range(16):
@@ -258,29 +613,95 @@ class ImageEditorWidget(QWidget):
         self.color_label_group[index].setStyleSheet(f"background-color: rgb{color};")
 
     def get_combined_image(self):
-        combined_image = Image.new("RGBA", (self.image.width, self.image.height))
-        for y, image_line in enumerate(self.image_lines):
-            combined_image.paste(image_line.image, (0, y))
-        return combined_image
+        return self.frame_buffer.to_image()
 
     def reset_copper_effect(self):
-        self.undo_last_change()
+        # Sin efecto Copper todas las líneas vuelven a la paleta de la imagen
+        self.frame_buffer.set_line_palettes(0, [0] * self.frame_buffer.height)
+        self.update_image_with_current_zoom()
 
-    def update_copper_position(self, position):
-        self.edit_history.append(self.get_current_state())
-        self.palettes_array = self.palette_editor.get_palettes_array()
-        for i, image_line in enumerate(self.image_lines):
-            image_line.palette_index = (i + position) % 16
+    def update_copper_position(self, position, copper_index=-1):
+        # Mueve un Copper: solo cambian las líneas a partir de la menor de las dos posiciones
+        copper = self.coppers[copper_index]
+        first_line, _ = self.edit_history.do(CopperMoveEdit(self.coppers, copper, copper.position, position))
+        if self.copper_checkbox.isChecked():
+            self.copper_effect_editor.apply_copper_effect(self.initial_palette, first_line=first_line)
         self.update_image_with_current_zoom()
         self.slider_position_label.setText(f"Posición Y del Slider: {position}")
 
+    def export_genesis_tables(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Exportar tablas CRAM/HInt", "", "Todos los archivos (*)")
+        if not file_path:
+            return
+        cram_writes = export_copper_tables(self.coppers, os.path.splitext(file_path)[0], SCREEN_HEIGHT)
+        # Avisar de los Coppers que no caben en el HBlank antes de llegar a la ROM
+        problems = [load for load in analyze_cram_load(cram_writes, SCREEN_HEIGHT) if load.over_budget or load.overrun]
+        if problems:
+            QMessageBox.warning(self, "Presupuesto de CRAM", "\n".join(str(load) for load in problems))
+
+    def optimize_cram_writes(self):
+        # Renumerar píxeles y paletas conserva la imagen solo si cada franja se ve con la paleta de su Copper
+        if not self.copper_checkbox.isChecked():
+            QMessageBox.information(self, "Optimizar CRAM", "Activa el efecto Copper para optimizar sus escrituras.")
+            return
+        permutations, report = optimize_coppers(self.coppers)
+        self.frame_set.store_current()
+        edit = permutation_edit(self.frame_buffer, self.frame_set.frames, self.coppers, permutations,
+                                self.copper_effect_editor.screen_top)
+        if edit is not None:
+            self.edit_history.do(edit)
+            self.refresh_after_history_change()
+        QMessageBox.information(self, "Optimizar CRAM", str(report))
+
+    def save_project_file(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Guardar proyecto", "",
+                                                   f"Proyecto HSPaint (*{PROJECT_EXTENSION})")
+        if not file_path:
+            return
+        if not is_project_path(file_path):
+            file_path += PROJECT_EXTENSION
+        try:
+            self.frame_set.store_current()
+            save_project(file_path, self.frame_buffer, self.coppers, self.edit_history,
+                         image_path=self.image_path, copper_effect=self.copper_checkbox.isChecked(),
+                         screen_top=self.copper_effect_editor.screen_top,
+                         frames=self.frame_set.frames, current_frame=self.frame_set.current,
+                         frame_paths=self.frame_paths)
+        except (OSError, ValueError) as error:
+            QMessageBox.warning(self, "Error", f"No se pudo guardar el proyecto: {error}")
+
+    def toggle_render_stats(self, state):
+        enabled = state == Qt.Checked
+        render_stats.enabled = enabled
+        self.stats_label.setVisible(enabled)
+        self.stats_dump_button.setVisible(enabled)
+        if enabled:
+            render_stats.reset()
+            self.stats_timer.start()
+        else:
+            self.stats_timer.stop()
+
+    def refresh_render_stats(self):
+        self.stats_label.setText("etapa          último   media  máximo\n" + render_stats.report_text())
+
+    def dump_render_stats(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Guardar tiempos de render", "render_stats.json",
+                                                   "JSON (*.json)")
+        if file_path:
+            render_stats.dump(file_path)
+
     def update_mouse_position(self, event):
-        x_position = int(event.x() / self.get_current_zoom_level())
-        y_position = int(event.y() / self.get_current_zoom_level())
-        self.x_position_label.setText(f"Posición X: {x_position}")
-        self.y_position_label.setText(f"Posición Y: {y_position}")
+        position = self.image_label.map_to_image(self.image_label.mapFrom(self.scroll_area, event.pos()))
+        self.x_position_label.setText(f"Posición X: {position.x()}")
+        if self.tall_image:
+            screen_line = position.y() - self.copper_effect_editor.screen_top
+            self.y_position_label.setText(f"Posición Y: {position.y()} (línea de pantalla {screen_line})")
+        else:
+            self.y_position_label.setText(f"Posición Y: {position.y()}")
 
     def eventFilter(self, watched, event):
         if watched == self.scroll_area and event.type() == QEvent.MouseMove:
             self.update_mouse_position(event)
+        elif watched == self.scroll_area.viewport() and event.type() == QEvent.Resize:
+            self.update_viewport()
         return super().eventFilter(watched, event)
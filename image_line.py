@@ -1,6 +1,23 @@
 #image_line.py
 
 class ImageLine:
-    def __init__(self, image, palette_index):
-        self.image = image
-        self.palette_index = palette_index
+    # Vista de una línea del FrameBuffer: no guarda píxeles ni paleta propios
+    def __init__(self, frame_buffer, y):
+        self.frame_buffer = frame_buffer
+        self.y = y
+
+    @property
+    def pixels(self):
+        return self.frame_buffer.indices[self.y]
+
+    @property
+    def palette_index(self):
+        return int(self.frame_buffer.line_palettes[self.y])
+
+    @palette_index.setter
+    def palette_index(self, palette_index):
+        self.frame_buffer.set_line_palette(self.y, palette_index)
+
+    @property
+    def image(self):
+        return self.frame_buffer.line_image(self.y)
@@ -0,0 +1,164 @@
+#image_view.py
+from PyQt5.QtWidgets import QWidget
+from PyQt5.QtGui import QPainter, QImage, QPixmap, QColor
+from PyQt5.QtCore import Qt, QRect, QRectF, QPoint
+from PyQt5 import sip
+
+from frame_cache import FrameCache
+from render_stats import render_stats
+
+PIXMAP_CACHE_BYTES = 64 * 1024 * 1024
+# Las franjas visibles se redondean a bloques de filas: un desplazamiento pequeño no obliga a recomponer
+TILE_HEIGHT = 64
+SCREEN_WINDOW_COLOR = QColor(255, 255, 0)
+
+
+def wrap_array(array, image_format):
+    # QImage sobre la memoria del array, sin copias: el array debe vivir más que la imagen
+    height, width = array.shape
+    return QImage(sip.voidptr(array.ctypes.data), width, height, array.strides[0], image_format)
+
+
+def pixmap_bytes(pixmap):
+    return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+
+def visible_band(scroll_top, viewport_height, zoom, image_height, tile=TILE_HEIGHT):
+    # Filas [inicio, fin) de la imagen que hay en pantalla, ampliadas a bloques enteros y un bloque de margen
+    top = int(scroll_top / zoom)
+    bottom = int((scroll_top + viewport_height) / zoom) + 1
+    top = max(0, (top // tile - 1) * tile)
+    bottom = min(image_height, (bottom // tile + 2) * tile)
+    return top, max(top, bottom)
+
+
+class ImageView(QWidget):
+    def __init__(self, parent=None, cache_scaled=True):
+        super().__init__(parent)
+        self.image = None
+        # Primera fila de la imagen completa que contiene self.image (franja visible)
+        self.image_top = 0
+        # Tamaño de la imagen completa; la vista se dimensiona con él aunque solo tenga una franja
+        self.content_size = None
+        # Ventana de pantalla [inicio, fin) que se marca sobre imágenes más altas que la pantalla
+        self.screen_window = None
+        self.zoom = 1.0
+        # Pixmaps ya escalados por nivel de zoom; se parchean por filas al editar
+        self.cache_scaled = cache_scaled
+        self.scaled_pixmaps = {}
+        # Clave de contenido de la imagen actual (frame_cache) y pixmaps de estados anteriores por (clave, zoom)
+        self.frame_key = None
+        self.pixmap_cache = FrameCache(PIXMAP_CACHE_BYTES, name="pixmap_cache", size=pixmap_bytes)
+
+    def set_image(self, image, top=0, key=None):
+        self.image = image
+        self.image_top = top
+        self.invalidate(key)
+
+    def set_content_size(self, width, height):
+        self.content_size = (width, height)
+        self.update_size()
+
+    def set_screen_window(self, window):
+        self.screen_window = window
+        self.update()
+
+    def replace_image(self, image, spans, key=None):
+        # Misma geometría, contenido nuevo solo en los tramos indicados: se conserva la caché
+        self.image = image
+        if key is not None and key != self.frame_key and (key, self.zoom) in self.pixmap_cache:
+            # Estado ya visto con este zoom: se recupera su pixmap en lugar de parchear filas
+            self.invalidate(key)
+            return
+        self.update_rows(spans)
+        self.frame_key = key
+
+    def set_zoom(self, zoom):
+        if zoom != self.zoom:
+            self.zoom = zoom
+            self.update_size()
+            self.update()
+
+    def update_size(self):
+        if self.content_size is not None:
+            width, height = self.content_size
+        elif self.image is not None:
+            width, height = self.image.width(), self.image.height()
+        else:
+            return
+        self.setFixedSize(int(width * self.zoom), int(height * self.zoom))
+
+    def invalidate(self, key=None):
+        # El contenido completo ha cambiado (imagen nueva o tabla de colores); los pixmaps del
+        # estado anterior se guardan por si se vuelve a él
+        if self.frame_key is not None:
+            for zoom, pixmap in self.scaled_pixmaps.items():
+                self.pixmap_cache.put((self.frame_key, zoom), pixmap)
+        self.scaled_pixmaps.clear()
+        self.frame_key = key
+        self.update_size()
+        self.update()
+
+    def update_rows(self, spans):
+        # Parchea las filas en los pixmaps escalados y repinta solo esas franjas (filas de la imagen completa)
+        top = self.image_top
+        with render_stats.stage("patch_cache"):
+            for zoom, pixmap in self.scaled_pixmaps.items():
+                painter = QPainter(pixmap)
+                for start, stop in spans:
+                    painter.drawImage(self.row_rect(start - top, stop - top, zoom, pixmap.width()),
+                                      self.image, QRect(0, start - top, self.image.width(), stop - start))
+                painter.end()
+        for start, stop in spans:
+            self.update(self.row_rect(start, stop, self.zoom, self.width()))
+
+    def row_rect(self, start, stop, zoom, width):
+        top = int(start * zoom)
+        return QRect(0, top, width, int(stop * zoom) - top)
+
+    def scaled_pixmap(self):
+        pixmap = self.scaled_pixmaps.get(self.zoom)
+        if pixmap is None and self.frame_key is not None:
+            # take(): el pixmap vuelve a ser el actual y se parcheará en sitio
+            pixmap = self.pixmap_cache.take((self.frame_key, self.zoom))
+        if pixmap is None:
+            # Escalado por vecino más próximo: los píxeles de origen nunca se degradan
+            with render_stats.stage("scale"):
+                scaled = self.image.scaled(int(self.image.width() * self.zoom), int(self.image.height() * self.zoom),
+                                           Qt.IgnoreAspectRatio, Qt.FastTransformation)
+                if scaled.size() == self.image.size():
+                    # A zoom 1 scaled() devuelve la misma imagen, que envuelve la memoria de un array:
+                    # al parchear el pixmap se escribiría en el array (que puede estar en la caché de fotogramas)
+                    scaled = scaled.copy()
+                pixmap = QPixmap.fromImage(scaled)
+        self.scaled_pixmaps[self.zoom] = pixmap
+        return pixmap
+
+    def map_to_image(self, pos):
+        return QPoint(int(pos.x() / self.zoom), int(pos.y() / self.zoom))
+
+    def paintEvent(self, event):
+        if self.image is None:
+            return
+        with render_stats.stage("paint"):
+            painter = QPainter(self)
+            # Solo se dibuja lo expuesto que cae dentro de la franja; fuera de ella aún no hay píxeles
+            offset = int(self.image_top * self.zoom)
+            band = QRect(0, offset, int(self.image.width() * self.zoom), int(self.image.height() * self.zoom))
+            exposed = event.rect()
+            if not band.contains(exposed):
+                painter.fillRect(exposed, self.palette().dark())
+            target = QRectF(exposed.intersected(band))
+            if not target.isEmpty():
+                if self.cache_scaled:
+                    painter.drawPixmap(target, self.scaled_pixmap(), target.translated(0, -offset))
+                else:
+                    # Transformación de vista: solo se escala la parte expuesta de la imagen
+                    source = QRectF(target.x() / self.zoom, target.y() / self.zoom - self.image_top,
+                                    target.width() / self.zoom, target.height() / self.zoom)
+                    painter.drawImage(target, self.image, source)
+            if self.screen_window is not None:
+                start, stop = self.screen_window
+                painter.setPen(SCREEN_WINDOW_COLOR)
+                painter.drawRect(self.row_rect(start, stop, self.zoom, self.width()).adjusted(0, 0, -1, -1))
+            painter.end()
@@ -1,18 +1,28 @@
-from PyQt5.QtWidgets import QApplication, QMainWindow, QFileDialog
-from PyQt5.QtGui import QIcon
 import sys
-from image_editor_widget import ImageEditorWidget
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    # Qt is only imported when running as a program; the editor and the model behind it
+    # (numpy, PIL) only once there is something to open, so the file dialog shows up sooner
+    from PyQt5.QtWidgets import QApplication, QMainWindow, QFileDialog
+    from PyQt5.QtGui import QIcon
 
-    # Open a file dialog to select an image
-    file_dialog = QFileDialog()
-    image_path, _ = file_dialog.getOpenFileName(None, "Select Image", "", "Images (*.png *.xpm *.jpg *.bmp);;All Files (*)")
+    app = QApplication(sys.argv)
 
-    if not image_path:
+    # Image or project paths may be given on the command line; otherwise ask for them.
+    # Several images open as the frames of one animation sharing palettes and coppers.
+    if len(sys.argv) > 1:
+        image_paths = sys.argv[1:]
+    else:
+        file_dialog = QFileDialog()
+        image_paths, _ = file_dialog.getOpenFileNames(
+            None, "Select Image or Frames", "",
+            "Images and projects (*.png *.xpm *.jpg *.bmp *.hsp);;Projects (*.hsp);;All Files (*)")
+
+    if not image_paths:
         sys.exit()
 
+    from image_editor_widget import ImageEditorWidget
+
     # Create and show the main application window
     window = QMainWindow()
     window.setGeometry(100, 100, 800, 600)
@@ -25,7 +35,7 @@ if __name__ == '__main__':
     window.showMaximized()  # Show maximized
 
     # Create and set the central widget as the ImageEditorWidget
-    image_editor = ImageEditorWidget(image_path)
+    image_editor = ImageEditorWidget(image_paths[0], image_paths[1:])
     window.setCentralWidget(image_editor)
 
     sys.exit(app.exec_())
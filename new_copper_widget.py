@@ -1,21 +1,55 @@
-from PyQt5.QtWidgets import QLabel, QRadioButton, QVBoxLayout, QGroupBox, QPushButton, QFileDialog, QHBoxLayout, QDialog
+from PyQt5.QtWidgets import QLabel, QRadioButton, QVBoxLayout, QGroupBox, QPushButton, QFileDialog, QHBoxLayout, QDialog, QComboBox, QMessageBox
 from PyQt5.QtGui import QPixmap, QColor
-from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtCore import Qt, pyqtSignal, QRunnable, QThreadPool
 from random import randint
+import os
 from color_picker_label import ColorPickerLabel
 from palette_editor import PaletteEditor
+from palette_library import default_library
+from remap import DITHER_NONE, DITHER_ORDERED, DITHER_DIFFUSION
+
+# Qué hacer con los píxeles de la franja al cambiar de paleta (None: se quedan los índices)
+REMAP_OPTIONS = [
+    ("Mantener los índices de los píxeles", None),
+    ("Reasignar al color más cercano", DITHER_NONE),
+    ("Reasignar con tramado ordenado", DITHER_ORDERED),
+    ("Reasignar con difusión de error", DITHER_DIFFUSION),
+]
+
+class LibraryScanJob(QRunnable):
+    # Indexar un directorio lee todos sus archivos de paleta: fuera del hilo de la interfaz
+    def __init__(self, widget, directory):
+        super().__init__()
+        self.widget = widget
+        self.directory = directory
+
+    def run(self):
+        try:
+            default_library.scan(self.directory)
+        except OSError:
+            return
+        self.widget.library_scanned.emit()
+
 
 class NewCopperWidget(QGroupBox):
     accepted = pyqtSignal()
-    def __init__(self, previous_palette=None, parent=None):
-        print(parent.coppers)
-        #super().__init__(f"Copper línea {parent.coppers.index(self) + 1}", parent)
-        super().__init__(f"Copper línea ...", parent)
+    # Se emite (desde el hilo del escaneo) cuando la biblioteca tiene paletas nuevas
+    library_scanned = pyqtSignal()
+    def __init__(self, previous_palette=None, parent=None, position=0):
+        super().__init__(f"Copper línea {position}", parent)
         self.palette_option = None
         self.palette_text = None
         self.previous_palette = previous_palette
         self.init_ui()
 
+    def set_target(self, position, previous_palette):
+        # Un único editor se reutiliza para cualquier Copper de la lista
+        self.setTitle(f"Copper línea {position}")
+        self.previous_palette = previous_palette
+        self.palette_text = None
+        self.set_palette_option("modify")
+        self.modify_palette_button.setChecked(True)
+
     def init_ui(self):
         layout = QVBoxLayout(self)
 
@@ -31,6 +65,13 @@ class NewCopperWidget(QGroupBox):
         layout.addWidget(self.modify_palette_button)
         layout.addWidget(self.random_palette_button)
 
+        # Paletas ya indexadas en la biblioteca: se eligen sin diálogo ni relectura
+        self.library_combo = QComboBox(self)
+        self.library_combo.activated.connect(self.on_library_palette_selected)
+        self.library_scanned.connect(self.refresh_library_combo)
+        layout.addWidget(self.library_combo)
+        self.refresh_library_combo()
+
         self.palette_display_layout = QHBoxLayout()
         layout.addLayout(self.palette_display_layout)
 
@@ -41,6 +82,11 @@ class NewCopperWidget(QGroupBox):
 
         layout.addWidget(self.regenerate_button)
 
+        self.remap_combo = QComboBox(self)
+        for text, mode in REMAP_OPTIONS:
+            self.remap_combo.addItem(text, mode)
+        layout.addWidget(self.remap_combo)
+
         confirm_button = QPushButton("Confirmar", self)
         confirm_button.clicked.connect(self.confirm_and_close)
         layout.addWidget(confirm_button)
@@ -68,33 +114,60 @@ class NewCopperWidget(QGroupBox):
         palette = []
         for i in range(16):
             color_label = self.palette_display_layout.itemAt(i).widget()
-            color = color_label.color()
-            palette.append((color.red(), color.green(), color.blue()))
+            palette.append(color_label.color)
         return palette
 
+    def get_selected_palette(self):
+        return self.get_current_palette()
+
+    def get_remap_mode(self):
+        return self.remap_combo.currentData()
+
+    def get_palette_path(self):
+        # Archivo de la paleta elegida, si sale de uno (el editor lo vigila para recargarla)
+        return self.palette_text if self.palette_option == "load" else None
+
+    def get_palette_text(self):
+        if self.palette_text:
+            return self.palette_text
+        return ", ".join(str(color) for color in self.get_current_palette())
+
     def confirm_and_close(self):
-        if self.palette_option == "load":
-            # No es necesario hacer nada aquí ya que la acción ocurre en on_load_palette_button_toggled
-            pass
-        elif self.palette_option == "modify":
-            current_palette = self.get_current_palette()
-            self.add_copper_instance(current_palette)
-            self.parent().on_new_copper_widget_accepted()  # Llamar al método en CopperEffectEditor
-        elif self.palette_option == "random":
-            current_palette = self.get_current_palette()
-            self.add_copper_instance(current_palette)
-            self.parent().on_new_copper_widget_accepted()  # Llamar al método en CopperEffectEditor
+        # Quien creó el editor lee la paleta con get_selected_palette al recibir accepted
+        if self.palette_display_layout.count() < 16:
+            return
         self.accepted.emit()
+        self.hide()
 
     def load_palette_from_file(self):
         file_dialog = QFileDialog()
         file_path, _ = file_dialog.getOpenFileName(self, "Select PAL file", "", "PAL Files (*.pal);;All Files (*)")
 
         if file_path:
-            self.palette_text = file_path
+            self.show_library_palette(file_path)
+            # El resto de paletas de la carpeta se añaden a la biblioteca en segundo plano
+            QThreadPool.globalInstance().start(LibraryScanJob(self, os.path.dirname(file_path)))
+
+    def refresh_library_combo(self):
+        paths = default_library.paths()
+        self.library_combo.clear()
+        for path in paths:
+            self.library_combo.addItem(os.path.basename(path), path)
+        self.library_combo.setVisible(bool(paths))
+
+    def on_library_palette_selected(self, index):
+        self.palette_option = "load"
+        self.show_library_palette(self.library_combo.itemData(index))
+
+    def show_library_palette(self, file_path):
+        try:
             palette_colors = PaletteEditor.load_palette_from_file(file_path)
-            self.clear_palette_display()
-            self.display_palette(palette_colors)
+        except (OSError, ValueError) as error:
+            QMessageBox.warning(self, "Error", f"No se pudo cargar la paleta: {error}")
+            return
+        self.palette_text = file_path
+        self.clear_palette_display()
+        self.display_palette(palette_colors)
 
     def generate_random_palette(self):
         return [(randint(0, 255), randint(0, 255), randint(0, 255)) for _ in range(16)]
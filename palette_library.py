@@ -0,0 +1,126 @@
+#palette_library.py
+# Biblioteca de paletas: indexa un directorio una vez y sirve las paletas desde memoria.
+# Formatos: JASC-PAL (.pal), volcados binarios de CRAM (.bin, .cram) y GIMP (.gpl).
+import os
+import threading
+
+from genesis_export import cram_to_rgb
+
+PALETTE_SIZE = 16
+# Un volcado de CRAM es de 16 a 64 palabras; cualquier otro .bin (una ROM, por ejemplo) no es una paleta
+CRAM_DUMP_BYTES = (32, 128)
+# Límite para las paletas de texto: ninguna paleta real se acerca
+MAX_PALETTE_FILE_BYTES = 64 * 1024
+
+
+def parse_jasc_pal(data):
+    lines = data.decode("ascii", errors="replace").splitlines()
+    # Verifica si el formato es válido
+    if len(lines) < 3 or lines[0].strip() != 'JASC-PAL' or lines[1].strip() != '0100':
+        raise ValueError('Formato de archivo de paleta no válido.')
+    num_colors = int(lines[2].strip())
+    colors = [tuple(map(int, line.split()[:3])) for line in lines[3:3 + num_colors] if line.strip()]
+    if len(colors) != num_colors:
+        raise ValueError('El archivo PAL tiene menos colores de los que declara.')
+    return colors
+
+
+def check_cram_dump_size(size):
+    if not CRAM_DUMP_BYTES[0] <= size <= CRAM_DUMP_BYTES[1]:
+        raise ValueError(f'Un volcado de CRAM ocupa de {CRAM_DUMP_BYTES[0]} a {CRAM_DUMP_BYTES[1]} bytes '
+                         f'(este, {size}).')
+
+
+def parse_cram_dump(data):
+    # Palabras de 16 bits big endian en formato CRAM (----BBB-GGG-RRR-)
+    check_cram_dump_size(len(data))
+    if len(data) % 2:
+        raise ValueError('El volcado de CRAM debe tener un número par de bytes.')
+    words = [int.from_bytes(data[i:i + 2], "big") for i in range(0, len(data), 2)]
+    return [tuple(color) for color in cram_to_rgb(words).tolist()]
+
+
+def parse_gimp_gpl(data):
+    lines = data.decode("utf-8", errors="replace").splitlines()
+    if not lines or lines[0].strip() != 'GIMP Palette':
+        raise ValueError('Formato de paleta GIMP no válido.')
+    colors = []
+    for line in lines[1:]:
+        line = line.strip()
+        # Cabeceras opcionales (Name:, Columns:) y comentarios
+        if not line or line.startswith('#') or ':' in line.split()[0]:
+            continue
+        colors.append(tuple(int(value) for value in line.split()[:3]))
+    return colors
+
+
+PARSERS = {
+    ".pal": parse_jasc_pal,
+    ".bin": parse_cram_dump,
+    ".cram": parse_cram_dump,
+    ".gpl": parse_gimp_gpl,
+}
+
+
+def fit_palette(colors, size=PALETTE_SIZE):
+    # Recorta o completa con negro hasta el tamaño de paleta del hardware
+    if not colors:
+        raise ValueError('La paleta no tiene colores.')
+    colors = list(colors[:size])
+    return colors + [(0, 0, 0)] * (size - len(colors))
+
+
+class PaletteLibrary:
+    def __init__(self):
+        # Índice memoizado: ruta -> (mtime, colores)
+        self.cache = {}
+        self.scanned_directories = set()
+        # scan puede ir en un hilo aparte mientras la interfaz lee el índice
+        self.lock = threading.Lock()
+
+    def scan(self, directory):
+        # Añade las paletas del directorio (sin subdirectorios) al índice; cada directorio se recorre una sola vez
+        directory = os.path.abspath(directory)
+        with self.lock:
+            if directory in self.scanned_directories:
+                return
+            self.scanned_directories.add(directory)
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if os.path.splitext(name)[1].lower() in PARSERS and os.path.isfile(path):
+                try:
+                    self.load(path)
+                except (OSError, ValueError):
+                    continue
+
+    def paths(self):
+        with self.lock:
+            return sorted(self.cache)
+
+    def load(self, path, size=None):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        mtime = stat.st_mtime_ns
+        cached = self.cache.get(path)
+        if cached is None or cached[0] != mtime:
+            # Solo se vuelve a leer si el archivo ha cambiado desde la última vez. El tamaño se
+            # comprueba antes de leer: un archivo enorme con la extensión de una paleta no se carga
+            parser = PARSERS.get(os.path.splitext(path)[1].lower(), parse_jasc_pal)
+            if parser is parse_cram_dump:
+                check_cram_dump_size(stat.st_size)
+            elif stat.st_size > MAX_PALETTE_FILE_BYTES:
+                raise ValueError(f'El archivo ocupa {stat.st_size} bytes: no parece una paleta.')
+            with open(path, 'rb') as file:
+                cached = (mtime, parser(file.read()))
+            with self.lock:
+                self.cache[path] = cached
+        colors = cached[1]
+        return fit_palette(colors, size) if size else list(colors)
+
+    def forget(self, path):
+        with self.lock:
+            self.cache.pop(os.path.abspath(path), None)
+
+
+# Biblioteca compartida por todo el editor
+default_library = PaletteLibrary()
@@ -0,0 +1,70 @@
+#palette_table.py
+import numpy as np
+
+PALETTE_ENTRIES = 256
+
+
+def pack_rgb32(colors):
+    colors = np.asarray(colors, dtype=np.uint32)
+    return 0xFF000000 | (colors[..., 0] << 16) | (colors[..., 1] << 8) | colors[..., 2]
+
+
+class PaletteTable:
+    # Tabla compartida de paletas: las líneas y los Coppers las referencian por índice
+    def __init__(self, capacity=4):
+        self.count = 0
+        self.colors = np.zeros((capacity, PALETTE_ENTRIES, 3), dtype=np.uint8)
+        # Las mismas paletas empaquetadas en RGB32 (0xAARRGGBB) para componer
+        self.packed = np.full((capacity, PALETTE_ENTRIES), 0xFF000000, dtype=np.uint32)
+        # Funciones a las que se avisa con el índice de la paleta modificada
+        self.listeners = []
+
+    def __len__(self):
+        return self.count
+
+    @classmethod
+    def from_colors(cls, colors):
+        # Tabla completa de una vez (P x 256 x 3), sin avisar a nadie: p. ej. al cargar un proyecto
+        colors = np.asarray(colors, dtype=np.uint8).reshape(-1, PALETTE_ENTRIES, 3)
+        table = cls(capacity=max(len(colors), 4))
+        table.count = len(colors)
+        table.colors[:table.count] = colors
+        table.packed[:table.count] = pack_rgb32(colors)
+        return table
+
+    def add(self, colors):
+        if self.count == len(self.colors):
+            # Crecimiento amortizado: se duplica la capacidad
+            capacity = len(self.colors) * 2
+            self.colors = np.resize(self.colors, (capacity, PALETTE_ENTRIES, 3))
+            self.packed = np.resize(self.packed, (capacity, PALETTE_ENTRIES))
+        palette_id = self.count
+        self.count += 1
+        self.colors[palette_id] = 0
+        self.packed[palette_id] = 0xFF000000
+        self.set_palette(palette_id, colors)
+        return palette_id
+
+    def set_palette(self, palette_id, colors):
+        colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)[:PALETTE_ENTRIES]
+        if np.array_equal(self.colors[palette_id, :len(colors)], colors):
+            return
+        self.colors[palette_id, :len(colors)] = colors
+        self.packed[palette_id, :len(colors)] = pack_rgb32(colors)
+        self.notify(palette_id)
+
+    def get_color(self, palette_id, index):
+        r, g, b = self.colors[palette_id, index]
+        return (int(r), int(g), int(b))
+
+    def set_color(self, palette_id, index, color):
+        self.colors[palette_id, index] = color
+        self.packed[palette_id, index] = pack_rgb32(self.colors[palette_id, index])
+        self.notify(palette_id)
+
+    def get_palette(self, palette_id, size=16):
+        return [tuple(color) for color in self.colors[palette_id, :size].tolist()]
+
+    def notify(self, palette_id):
+        for listener in self.listeners:
+            listener(palette_id)
@@ -0,0 +1,276 @@
+#project_file.py
+# Proyecto .hsp: archivo binario por bloques con cabecera versionada.
+#
+#   cabecera  "HSPJ", versión (u16), opciones (u16), número de bloques (u32), relleno
+#   bloque    identificador (4 bytes), relleno, tamaño (u64) y datos alineados a 8 bytes
+#
+# Bloques: META (JSON), INDX (índices u8, alto x ancho), PALT (paletas u8, P x 256 x 3),
+# LINE (paleta de cada línea, u16), COPR (Coppers), FRMS (resto de fotogramas de una
+# animación, u8, N x alto x ancho; opcional), HIST (historial, opcional) y ROWS (filas de
+# índices antes y después de cada edición de píxeles del historial; los registros de HIST
+# guardan su desplazamiento).
+# Los lectores ignoran los bloques que no conocen, así que añadir bloques no rompe los
+# proyectos antiguos; solo un cambio incompatible sube FORMAT_VERSION.
+import json
+import mmap
+import os
+import struct
+from collections import deque
+
+import numpy as np
+
+from frame_buffer import FrameBuffer
+from palette_table import PaletteTable
+from copper_schedule import CopperSchedule
+from copper import Copper
+from edit_history import (
+    EditHistory, PaletteColorEdit, CopperAddEdit, CopperRemoveEdit, CopperPaletteEdit, CopperMoveEdit,
+    IndexEdit, CompoundEdit
+)
+
+MAGIC = b"HSPJ"
+# 2: el historial puede tener ediciones de píxeles (ROWS) y compuestas, que la versión 1 no sabe leer
+FORMAT_VERSION = 2
+PROJECT_EXTENSION = ".hsp"
+HEADER = struct.Struct("<4sHHI4x")
+CHUNK_HEADER = struct.Struct("<4s4xQ")
+ALIGNMENT = 8
+COPPER_DTYPE = np.dtype([("position", "<u4"), ("palette_id", "<u2"), ("in_schedule", "<u2")])
+
+
+class Project:
+    def __init__(self, frame_buffer, coppers, edit_history=None, image_path="", copper_effect=False, screen_top=0,
+                 frames=None, current_frame=0, frame_paths=()):
+        self.frame_buffer = frame_buffer
+        # Buffers de índices de todos los fotogramas; frames[current_frame] es el del FrameBuffer
+        self.frames = frames or [frame_buffer.indices]
+        self.current_frame = current_frame
+        # Archivo de imagen de frames[1:], para seguir vigilándolos al reabrir
+        self.frame_paths = list(frame_paths)
+        self.coppers = coppers
+        self.edit_history = edit_history
+        self.image_path = image_path
+        self.copper_effect = copper_effect
+        self.screen_top = screen_top
+
+
+def is_project_path(path):
+    return path.lower().endswith(PROJECT_EXTENSION)
+
+
+def edit_record(edit, copper_ids, frame_ids, rows):
+    # CopperRemoveEdit hereda de CopperAddEdit: se comprueba antes. Las filas de las ediciones de
+    # píxeles se añaden a rows (el bloque ROWS)
+    if isinstance(edit, CompoundEdit):
+        return {"type": "compound", "edits": [edit_record(child, copper_ids, frame_ids, rows) for child in edit.edits]}
+    if isinstance(edit, IndexEdit):
+        if id(edit.indices) not in frame_ids:
+            raise ValueError("La edición de píxeles es de un fotograma que no está en el proyecto.")
+        record = {"type": "index", "frame": frame_ids[id(edit.indices)], "start": int(edit.start),
+                  "count": len(edit.old_rows), "offset": len(rows)}
+        rows += np.ascontiguousarray(edit.old_rows).tobytes() + np.ascontiguousarray(edit.new_rows).tobytes()
+        return record
+    if isinstance(edit, PaletteColorEdit):
+        return {"type": "palette_color", "palette_id": int(edit.palette_id), "index": int(edit.index),
+                "old": list(edit.old_color), "new": list(edit.new_color)}
+    if isinstance(edit, CopperRemoveEdit):
+        return {"type": "copper_remove", "copper": copper_ids[id(edit.copper)]}
+    if isinstance(edit, CopperAddEdit):
+        return {"type": "copper_add", "copper": copper_ids[id(edit.copper)]}
+    if isinstance(edit, CopperPaletteEdit):
+        return {"type": "copper_palette", "copper": copper_ids[id(edit.copper)],
+                "old": [list(color) for color in edit.old_palette],
+                "new": [list(color) for color in edit.new_palette],
+                "old_source": edit.old_source, "new_source": edit.new_source}
+    if isinstance(edit, CopperMoveEdit):
+        return {"type": "copper_move", "copper": copper_ids[id(edit.copper)],
+                "old": edit.old_position, "new": edit.new_position}
+    raise ValueError(f"No se sabe guardar la edición {type(edit).__name__}.")
+
+
+def saveable_records(edits, copper_ids, frame_ids, rows):
+    # Registros de las ediciones más cercanas al estado actual (edits va de la más cercana a la
+    # más lejana) hasta la primera que no se sabe guardar: las de detrás dependen de ella
+    records = []
+    for edit in edits:
+        size = len(rows)
+        try:
+            records.append(edit_record(edit, copper_ids, frame_ids, rows))
+        except ValueError:
+            del rows[size:]
+            break
+    return records
+
+
+def edit_from_record(record, palette_table, coppers, pool, frame_buffer=None, frames=(), rows=None):
+    kind = record["type"]
+    if kind == "compound":
+        return CompoundEdit([edit_from_record(child, palette_table, coppers, pool, frame_buffer, frames, rows)
+                             for child in record["edits"]])
+    if kind == "index":
+        width = frame_buffer.width
+        count, offset = record["count"], record["offset"]
+        old_rows = rows[offset:offset + count * width].reshape(count, width)
+        new_rows = rows[offset + count * width:offset + 2 * count * width].reshape(count, width)
+        return IndexEdit(frame_buffer, frames[record["frame"]], record["start"], old_rows, new_rows)
+    if kind == "palette_color":
+        return PaletteColorEdit(palette_table, record["palette_id"], record["index"],
+                                tuple(record["old"]), tuple(record["new"]))
+    copper = pool[record["copper"]]
+    if kind == "copper_add":
+        return CopperAddEdit(coppers, copper)
+    if kind == "copper_remove":
+        return CopperRemoveEdit(coppers, copper)
+    if kind == "copper_palette":
+        edit = CopperPaletteEdit(copper, [tuple(color) for color in record["old"]],
+                                 [tuple(color) for color in record["new"]], record.get("new_source"))
+        edit.old_source = record.get("old_source")
+        return edit
+    if kind == "copper_move":
+        return CopperMoveEdit(coppers, copper, record["old"], record["new"])
+    raise ValueError(f"Tipo de edición desconocido: {kind}")
+
+
+def edit_leaves(edit):
+    if isinstance(edit, CompoundEdit):
+        for child in edit.edits:
+            yield from edit_leaves(child)
+    else:
+        yield edit
+
+
+def history_coppers(edit_history):
+    return [leaf.copper for edit in list(edit_history.undo_stack) + edit_history.redo_stack
+            for leaf in edit_leaves(edit) if hasattr(leaf, "copper")]
+
+
+def save_project(path, frame_buffer, coppers, edit_history=None, image_path="", copper_effect=False, screen_top=0,
+                 frames=None, current_frame=0, frame_paths=()):
+    # Coppers de la lista más los que solo sobreviven en el historial (p. ej. uno borrado)
+    pool = list(coppers)
+    if edit_history is not None:
+        scheduled = set(map(id, pool))
+        for copper in history_coppers(edit_history):
+            if id(copper) not in scheduled:
+                scheduled.add(id(copper))
+                pool.append(copper)
+    copper_ids = {id(copper): i for i, copper in enumerate(pool)}
+    copper_table = np.zeros(len(pool), dtype=COPPER_DTYPE)
+    for i, copper in enumerate(pool):
+        copper_table[i] = (copper.position, copper.palette_id, i < len(coppers))
+
+    frames = frames or [frame_buffer.indices]
+    palette_table = frame_buffer.palette_table
+    meta = {"width": frame_buffer.width, "height": frame_buffer.height,
+            "color_count": frame_buffer.color_count, "palette_count": len(palette_table),
+            "image_path": image_path, "copper_effect": bool(copper_effect),
+            "screen_height": coppers.height, "screen_top": int(screen_top),
+            "frame_count": len(frames) if frames else 1, "current_frame": int(current_frame),
+            "frame_paths": list(frame_paths),
+            # Archivo de paleta de cada Copper de COPR (o null), para seguir vigilándolo al reabrir
+            "copper_sources": [copper.source_path for copper in pool]}
+    # INDX guarda el primer fotograma y FRMS los demás, sin repetir ninguno
+    chunks = [
+        (b"META", json.dumps(meta).encode("utf-8")),
+        (b"INDX", np.ascontiguousarray(frames[0]).tobytes()),
+        (b"PALT", palette_table.colors[:len(palette_table)].tobytes()),
+        (b"LINE", frame_buffer.line_palettes.astype("<u2").tobytes()),
+        (b"COPR", copper_table.tobytes()),
+    ]
+    if len(frames) > 1:
+        chunks.append((b"FRMS", b"".join(np.ascontiguousarray(frame).tobytes() for frame in frames[1:])))
+    if edit_history is not None:
+        # Una edición que no se sabe guardar corta el historial en ese punto en lugar de impedir
+        # guardar el proyecto. Las dos pilas tienen al final la edición más cercana al estado actual
+        frame_ids = {id(frame): i for i, frame in enumerate(frames)}
+        rows = bytearray()
+        undo = saveable_records(reversed(edit_history.undo_stack), copper_ids, frame_ids, rows)
+        redo = saveable_records(reversed(edit_history.redo_stack), copper_ids, frame_ids, rows)
+        history = {"undo": undo[::-1], "redo": redo[::-1]}
+        chunks.append((b"HIST", json.dumps(history).encode("utf-8")))
+        if rows:
+            chunks.append((b"ROWS", bytes(rows)))
+
+    # Se escribe aparte y se sustituye de golpe: un proyecto abierto sigue proyectado en memoria
+    # desde el archivo antiguo y truncarlo lo dejaría sin datos
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(chunks)))
+        for chunk_id, payload in chunks:
+            file.write(CHUNK_HEADER.pack(chunk_id, len(payload)))
+            file.write(payload)
+            file.write(b"\0" * (-len(payload) % ALIGNMENT))
+    os.replace(temporary_path, path)
+
+
+def read_chunks(data):
+    if len(data) < HEADER.size:
+        raise ValueError("El archivo de proyecto está truncado.")
+    magic, version, _, chunk_count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("No es un archivo de proyecto.")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"El proyecto es de una versión más reciente ({version}) que la admitida ({FORMAT_VERSION}).")
+    chunks = {}
+    offset = HEADER.size
+    for _ in range(chunk_count):
+        if offset + CHUNK_HEADER.size > len(data):
+            raise ValueError("El archivo de proyecto está truncado.")
+        chunk_id, size = CHUNK_HEADER.unpack_from(data, offset)
+        offset += CHUNK_HEADER.size
+        if offset + size > len(data):
+            raise ValueError("El archivo de proyecto está truncado.")
+        chunks[chunk_id] = (offset, size)
+        offset += size + (-size % ALIGNMENT)
+    return version, chunks
+
+
+def load_project(path, with_history=True):
+    # Proyección en memoria copy-on-write: los índices se leen del disco según se usan
+    # y editarlos nunca modifica el archivo
+    with open(path, "rb") as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+    _, chunks = read_chunks(data)
+    for required in (b"META", b"INDX", b"PALT", b"COPR"):
+        if required not in chunks:
+            raise ValueError(f"Falta el bloque {required.decode()} en el proyecto.")
+
+    def chunk_array(chunk_id, dtype, count=-1):
+        offset, size = chunks[chunk_id]
+        return np.frombuffer(data, dtype=dtype, count=count if count >= 0 else size // np.dtype(dtype).itemsize,
+                             offset=offset)
+
+    offset, size = chunks[b"META"]
+    meta = json.loads(bytes(data[offset:offset + size]).decode("utf-8"))
+    width, height = meta["width"], meta["height"]
+    frames = [chunk_array(b"INDX", np.uint8, width * height).reshape(height, width)]
+    if b"FRMS" in chunks:
+        frame_count = meta.get("frame_count", 1) - 1
+        frames += list(chunk_array(b"FRMS", np.uint8, frame_count * width * height).reshape(frame_count, height, width))
+    current_frame = min(meta.get("current_frame", 0), len(frames) - 1)
+    palette_table = PaletteTable.from_colors(chunk_array(b"PALT", np.uint8, meta["palette_count"] * 256 * 3))
+    frame_buffer = FrameBuffer(frames[current_frame], palette_table, meta.get("color_count", 16))
+    frames[current_frame] = frame_buffer.indices
+    if b"LINE" in chunks:
+        frame_buffer.line_palettes[:] = chunk_array(b"LINE", "<u2", height)
+
+    pool = [Copper(position=int(record["position"]), palette_id=int(record["palette_id"]), palette_table=palette_table)
+            for record in chunk_array(b"COPR", COPPER_DTYPE)]
+    for copper, source_path in zip(pool, meta.get("copper_sources", [])):
+        copper.source_path = source_path
+    in_schedule = chunk_array(b"COPR", COPPER_DTYPE)["in_schedule"]
+    coppers = CopperSchedule(meta.get("screen_height", height), [copper for copper, scheduled in zip(pool, in_schedule) if scheduled])
+
+    edit_history = None
+    if with_history and b"HIST" in chunks:
+        offset, size = chunks[b"HIST"]
+        history = json.loads(bytes(data[offset:offset + size]).decode("utf-8"))
+        rows = chunk_array(b"ROWS", np.uint8) if b"ROWS" in chunks else None
+        edit_history = EditHistory()
+        edit_history.undo_stack = deque(edit_from_record(record, palette_table, coppers, pool, frame_buffer, frames, rows)
+                                        for record in history["undo"])
+        edit_history.redo_stack = [edit_from_record(record, palette_table, coppers, pool, frame_buffer, frames, rows)
+                                   for record in history["redo"]]
+        edit_history.total_bytes = sum(edit.size() for edit in edit_history.undo_stack)
+    return Project(frame_buffer, coppers, edit_history, meta.get("image_path", ""), meta.get("copper_effect", False),
+                   meta.get("screen_top", 0), frames, current_frame, meta.get("frame_paths", [])[:len(frames) - 1])
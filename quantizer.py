@@ -0,0 +1,83 @@
+#quantizer.py
+# Cuantización de imágenes truecolor a 16 colores por franja de Coppers, ajustada al
+# espacio de color de la Genesis (3 bits por canal, 512 colores).
+import numpy as np
+
+PALETTE_SIZE = 16
+GENESIS_LEVELS = 8
+KMEANS_ITERATIONS = 8
+
+
+def genesis_codes(rgb):
+    # Código de 9 bits (R, G, B de 3 bits) de cada píxel
+    levels = (rgb.astype(np.uint16) * GENESIS_LEVELS) >> 8
+    return (levels[..., 0] << 6) | (levels[..., 1] << 3) | levels[..., 2]
+
+
+def codes_to_levels(codes):
+    codes = np.asarray(codes)
+    return np.stack(((codes >> 6) & 7, (codes >> 3) & 7, codes & 7), axis=-1)
+
+
+def levels_to_rgb(levels):
+    # Niveles 0-7 a 0-252, igual que cram_to_rgb en genesis_export
+    return (np.asarray(levels) * 36).astype(np.uint8)
+
+
+def band_palette(codes):
+    # Paleta de hasta 16 colores para los códigos de una franja.
+    # Se trabaja sobre el histograma de 512 códigos, no sobre los píxeles.
+    histogram = np.bincount(codes.ravel(), minlength=512)
+    present = np.flatnonzero(histogram)
+    if len(present) <= PALETTE_SIZE:
+        return present
+    weights = histogram[present].astype(np.float64)
+    points = codes_to_levels(present).astype(np.float64)
+    # Semillas: los códigos más frecuentes
+    centers = points[np.argsort(weights)[::-1][:PALETTE_SIZE]].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        distances = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels = distances.argmin(axis=1)
+        totals = np.bincount(labels, weights=weights, minlength=PALETTE_SIZE)
+        used = totals > 0
+        for channel in range(3):
+            sums = np.bincount(labels, weights=weights * points[:, channel], minlength=PALETTE_SIZE)
+            centers[used, channel] = sums[used] / totals[used]
+    levels = np.clip(np.rint(centers), 0, GENESIS_LEVELS - 1).astype(np.int64)
+    return np.unique((levels[:, 0] << 6) | (levels[:, 1] << 3) | levels[:, 2])
+
+
+def nearest_lookup(palette_codes):
+    # LUT de 512 entradas: índice de la paleta más cercano a cada color Genesis
+    all_levels = codes_to_levels(np.arange(512)).astype(np.int32)
+    palette_levels = codes_to_levels(palette_codes).astype(np.int32)
+    distances = ((all_levels[:, None, :] - palette_levels[None, :, :]) ** 2).sum(axis=2)
+    return distances.argmin(axis=1).astype(np.uint8)
+
+
+def quantize_bands(image, positions):
+    # Devuelve el buffer de índices (alto x ancho) y la lista de (posición, paleta) de cada franja
+    frames, coppers = quantize_frames([image], positions)
+    return frames[0], coppers
+
+
+def quantize_frames(images, positions):
+    # Varios fotogramas del mismo tamaño con una sola paleta por franja, calculada con los
+    # píxeles de todos ellos: las mismas franjas de Coppers sirven para toda la animación
+    codes = np.stack([genesis_codes(np.asarray(image.convert("RGB"))) for image in images])
+    height = codes.shape[1]
+    positions = sorted({0, *[position for position in positions if 0 <= position < height]})
+    indices = np.empty(codes.shape, dtype=np.uint8)
+    coppers = []
+    for start, stop in zip(positions, positions[1:] + [height]):
+        palette_codes = band_palette(codes[:, start:stop])
+        indices[:, start:stop] = nearest_lookup(palette_codes)[codes[:, start:stop]]
+        palette = [tuple(color) for color in levels_to_rgb(codes_to_levels(palette_codes)).tolist()]
+        # Se rellena hasta 16 entradas con el último color para que la paleta esté completa
+        palette += [palette[-1]] * (PALETTE_SIZE - len(palette))
+        coppers.append((start, palette))
+    return list(indices), coppers
+
+
+def band_positions(height, spacing):
+    return list(range(0, height, spacing))
@@ -0,0 +1,90 @@
+#remap.py
+# Reasignación de píxeles a una paleta nueva: cada píxel conserva su color (el de la paleta
+# anterior) lo mejor posible en la paleta nueva. La búsqueda del color más cercano pasa por
+# una tabla de 512 entradas, una por color de la Genesis, en lugar de medir distancias por píxel.
+import numpy as np
+
+from quantizer import genesis_codes, nearest_lookup
+
+DITHER_NONE = "none"
+DITHER_ORDERED = "ordered"
+DITHER_DIFFUSION = "diffusion"
+
+# Matriz de Bayer 4x4 normalizada a (-0.5, 0.5)
+BAYER_4X4 = (np.array([[0, 8, 2, 10],
+                       [12, 4, 14, 6],
+                       [3, 11, 1, 9],
+                       [15, 7, 13, 5]], dtype=np.float32) + 0.5) / 16 - 0.5
+# Amplitud del tramado ordenado en valores RGB (algo más de un nivel de la Genesis)
+ORDERED_SPREAD = 48.0
+
+
+def palette_lookup(palette):
+    # LUT código Genesis (9 bits) -> índice de la paleta más cercano
+    colors = np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+    return nearest_lookup(genesis_codes(colors))
+
+
+def rendered_colors(indices, palette):
+    # Colores con los que se ven los índices; los índices fuera de la paleta se ven negros
+    colors = np.zeros((256, 3), dtype=np.uint8)
+    palette = np.asarray(palette, dtype=np.uint8).reshape(-1, 3)[:256]
+    colors[:len(palette)] = palette
+    return colors[indices]
+
+
+def remap_indices(indices, old_palette, new_palette, dither=DITHER_NONE):
+    rgb = rendered_colors(indices, old_palette)
+    lut = palette_lookup(new_palette)
+    if dither == DITHER_ORDERED:
+        height, width = indices.shape
+        threshold = np.tile(BAYER_4X4, (height // 4 + 1, width // 4 + 1))[:height, :width]
+        rgb = np.clip(rgb + threshold[..., None] * ORDERED_SPREAD, 0, 255).astype(np.uint8)
+    elif dither == DITHER_DIFFUSION:
+        return diffuse_errors(rgb, new_palette, lut)
+    return lut[genesis_codes(rgb)]
+
+
+def diffuse_errors(rgb, palette, lut):
+    # Floyd-Steinberg: cada píxel depende del error del anterior, así que se recorre en orden.
+    # Listas de Python en lugar de escalares de numpy: es varias veces más rápido píxel a píxel.
+    height, width = rgb.shape[:2]
+    colors = np.asarray(palette, dtype=np.int32).reshape(-1, 3).tolist()
+    lut = lut.tolist()
+    work = rgb.astype(np.float32).tolist()
+    result = np.empty((height, width), dtype=np.uint8)
+    for y in range(height):
+        row = work[y]
+        below = work[y + 1] if y + 1 < height else None
+        out = [0] * width
+        for x in range(width):
+            r, g, b = row[x]
+            r = 0 if r < 0 else 255 if r > 255 else int(r)
+            g = 0 if g < 0 else 255 if g > 255 else int(g)
+            b = 0 if b < 0 else 255 if b > 255 else int(b)
+            index = lut[((r >> 5) << 6) | ((g >> 5) << 3) | (b >> 5)]
+            out[x] = index
+            pr, pg, pb = colors[index]
+            er, eg, eb = row[x][0] - pr, row[x][1] - pg, row[x][2] - pb
+            if x + 1 < width:
+                right = row[x + 1]
+                right[0] += er * 0.4375
+                right[1] += eg * 0.4375
+                right[2] += eb * 0.4375
+            if below is not None:
+                if x > 0:
+                    pixel = below[x - 1]
+                    pixel[0] += er * 0.1875
+                    pixel[1] += eg * 0.1875
+                    pixel[2] += eb * 0.1875
+                pixel = below[x]
+                pixel[0] += er * 0.3125
+                pixel[1] += eg * 0.3125
+                pixel[2] += eb * 0.3125
+                if x + 1 < width:
+                    pixel = below[x + 1]
+                    pixel[0] += er * 0.0625
+                    pixel[1] += eg * 0.0625
+                    pixel[2] += eb * 0.0625
+        result[y] = out
+    return result
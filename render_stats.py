@@ -0,0 +1,97 @@
+#render_stats.py
+# Tiempos y contadores de cada etapa del render. Desactivado, stage() devuelve siempre
+# el mismo gestor de contexto vacío y count() no hace nada.
+import json
+import threading
+import time
+from collections import defaultdict, deque
+
+DEFAULT_WINDOW = 120
+
+
+class NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+class Stage:
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stats.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class RenderStats:
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.enabled = False
+        self.window = window
+        # Últimas `window` duraciones (en segundos) de cada etapa
+        self.timings = defaultdict(lambda: deque(maxlen=self.window))
+        self.counters = defaultdict(int)
+        # record y count llegan desde los hilos de render; summary, desde la interfaz
+        self.lock = threading.Lock()
+
+    def stage(self, name):
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(self, name)
+
+    def record(self, name, seconds):
+        with self.lock:
+            self.timings[name].append(seconds)
+            self.counters[name] += 1
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] += amount
+
+    def reset(self):
+        with self.lock:
+            self.timings.clear()
+            self.counters.clear()
+
+    def summary(self):
+        # Se trabaja sobre una copia: un hilo de render puede añadir una etapa mientras tanto
+        with self.lock:
+            timings = {name: list(samples) for name, samples in self.timings.items()}
+            counters = dict(self.counters)
+        stages = {}
+        for name, samples in timings.items():
+            if samples:
+                stages[name] = {
+                    "last_ms": samples[-1] * 1000.0,
+                    "mean_ms": sum(samples) * 1000.0 / len(samples),
+                    "max_ms": max(samples) * 1000.0,
+                }
+        return {"stages": stages, "counters": counters}
+
+    def report_text(self):
+        summary = self.summary()
+        lines = [f"{name:<14} {stage['last_ms']:7.2f} {stage['mean_ms']:7.2f} {stage['max_ms']:7.2f} ms"
+                 for name, stage in sorted(summary["stages"].items())]
+        lines += [f"{name:<14} {value}" for name, value in sorted(summary["counters"].items())
+                  if name not in summary["stages"]]
+        return "\n".join(lines)
+
+    def dump(self, path):
+        with open(path, "w") as file:
+            json.dump(self.summary(), file, indent=2)
+
+
+# Instancia compartida por todo el editor
+render_stats = RenderStats()
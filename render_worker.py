@@ -0,0 +1,179 @@
+#render_worker.py
+# Composición de fotogramas fuera del hilo de la interfaz. Cada petición toma una instantánea
+# inmutable del FrameBuffer con un número de generación; una petición más reciente deja
+# obsoletas las anteriores, que se abandonan a medias y nunca llegan a la vista.
+# Solo se compone la franja de filas visible (band): con imágenes muy altas la memoria y
+# el tiempo de cada fotograma dependen de la ventana, no de la altura de la imagen.
+# Cada fila lleva una clave de contenido (frame_cache) que se recalcula solo para las filas
+# sucias; una franja ya compuesta antes se saca de la caché en lugar de recomponerla.
+# No hay caché por filas: buscar una fila cuesta más que componerla con numpy.
+# La composición en sí está en frame_compose, sin Qt.
+import numpy as np
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, QCoreApplication, QEvent, pyqtSignal
+
+from frame_cache import FrameCache
+from frame_compose import FrameSnapshot, compose_band
+from render_stats import render_stats
+
+FRAME_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class RenderJob(QRunnable):
+    def __init__(self, renderer, generation, base, base_top, base_keys, snapshot):
+        super().__init__()
+        self.renderer = renderer
+        self.generation = generation
+        self.base = base
+        self.base_top = base_top
+        self.base_keys = base_keys
+        self.snapshot = snapshot
+
+    def run(self):
+        # Se abandona a medias si ya hay una petición más reciente
+        result = compose_band(self.snapshot, self.base, self.base_top, self.base_keys, self.renderer.frame_cache,
+                              lambda: self.renderer.generation != self.generation)
+        if result is None:
+            return
+        frame, keys, key = result
+        self.renderer.frame_ready.emit(self.generation, frame, self.snapshot.band[0], (self.snapshot.spans, keys, key))
+
+
+class FrameRenderer(QObject):
+    # Se emite en el hilo de la interfaz con el fotograma RGB32 terminado (filas de la franja),
+    # su primera fila en la imagen, los tramos que han cambiado y su clave de contenido
+    frame_shown = pyqtSignal(object, int, object, object)
+    frame_ready = pyqtSignal(int, object, int, object)
+
+    def __init__(self, frame_buffer, parent=None):
+        super().__init__(parent)
+        self.frame_buffer = frame_buffer
+        self.generation = 0
+        # Último fotograma terminado y su primera fila; los trabajos parten de él y nunca lo modifican
+        self.front = None
+        self.front_top = 0
+        self.front_keys = np.zeros(0, dtype=np.uint64)
+        # Franjas compuestas por clave de fotograma; solo la usa el hilo de trabajo
+        self.frame_cache = FrameCache(FRAME_CACHE_BYTES, name="frame_cache")
+        # Filas [inicio, fin) que se componen; por defecto la imagen entera
+        self.band = (0, frame_buffer.height)
+        # Filas sucias desde el último fotograma aceptado (sobreviven a las cancelaciones)
+        self.pending = np.zeros(frame_buffer.height, dtype=bool)
+        # Un solo hilo: los fotogramas se terminan en orden y uno nuevo cancela al anterior
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.frame_ready.connect(self.on_frame_ready)
+        # Las peticiones de una misma ráfaga de eventos se agrupan en un solo render
+        self.request_timer = QTimer(self)
+        self.request_timer.setSingleShot(True)
+        self.request_timer.setInterval(0)
+        self.request_timer.timeout.connect(self.submit)
+
+    def set_band(self, top, bottom):
+        self.band = (max(0, top), min(self.frame_buffer.height, bottom))
+
+    def request(self):
+        if not self.request_timer.isActive():
+            self.request_timer.start()
+
+    def cancel(self):
+        self.request_timer.stop()
+        self.generation += 1
+        self.pool.clear()
+
+    def submit(self):
+        self.pending |= self.frame_buffer.dirty
+        self.frame_buffer.dirty[:] = False
+        top, bottom = self.band
+        if self.front is None:
+            self.front = np.zeros((0, self.frame_buffer.width), dtype=np.uint32)
+        # Filas de la franja que el último fotograma no contiene: hay que componerlas aunque no estén sucias
+        missing = np.ones(bottom - top, dtype=bool)
+        first = max(top, self.front_top)
+        last = min(bottom, self.front_top + len(self.front))
+        if first < last:
+            missing[first - top:last - top] = False
+        self.pending[top:bottom] |= missing
+        if not self.pending[top:bottom].any() and (top, bottom) == (self.front_top, self.front_top + len(self.front)):
+            return
+        self.generation += 1
+        self.pool.clear()
+        self.pool.start(RenderJob(self, self.generation, self.front, self.front_top, self.front_keys,
+                                  FrameSnapshot(self.frame_buffer, self.pending, self.band)))
+
+    def on_frame_ready(self, generation, frame, top, result):
+        if generation != self.generation:
+            render_stats.count("frames_discarded")
+            return
+        spans, keys, key = result
+        self.front = frame
+        self.front_top = top
+        self.front_keys = keys
+        # Las filas sucias fuera de la franja siguen pendientes hasta que se vean
+        self.pending[top:top + len(frame)] = False
+        render_stats.count("frames_shown")
+        if render_stats.enabled:
+            render_stats.count("rows_composed", sum(stop - start for start, stop in spans))
+        self.frame_shown.emit(frame, top, spans, key)
+
+    def flush(self):
+        # Espera al fotograma pendiente y lo entrega ya (exportación, pruebas y benchmarks)
+        if self.request_timer.isActive():
+            self.request_timer.stop()
+            self.submit()
+        self.pool.waitForDone()
+        QCoreApplication.sendPostedEvents(None, QEvent.MetaCall)
+
+
+class ThumbnailJob(QRunnable):
+    def __init__(self, renderer, generation, snapshot):
+        super().__init__()
+        self.renderer = renderer
+        self.generation = generation
+        self.snapshot = snapshot
+
+    def run(self):
+        if self.renderer.generation != self.generation:
+            return
+        with render_stats.stage("thumbnails"):
+            thumbnails = self.renderer.frame_set.render_all(snapshot=self.snapshot)
+        self.renderer.thumbnails_ready.emit(self.generation, thumbnails)
+
+
+class ThumbnailRenderer(QObject):
+    # Miniaturas de todos los fotogramas, compuestas en paralelo y en segundo plano
+    thumbnails_shown = pyqtSignal(object)
+    thumbnails_ready = pyqtSignal(int, object)
+
+    def __init__(self, frame_set, height=64, delay=100, parent=None):
+        super().__init__(parent)
+        self.frame_set = frame_set
+        self.step = max(1, frame_set.frame_buffer.height // height)
+        self.generation = 0
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.thumbnails_ready.connect(self.on_thumbnails_ready)
+        # Las miniaturas no necesitan seguir cada edición: se agrupan las de los últimos `delay` ms
+        self.request_timer = QTimer(self)
+        self.request_timer.setSingleShot(True)
+        self.request_timer.setInterval(delay)
+        self.request_timer.timeout.connect(self.submit)
+
+    def request(self):
+        if not self.request_timer.isActive():
+            self.request_timer.start()
+
+    def submit(self):
+        self.generation += 1
+        self.pool.clear()
+        self.pool.start(ThumbnailJob(self, self.generation, self.frame_set.snapshot(self.step)))
+
+    def on_thumbnails_ready(self, generation, thumbnails):
+        if generation == self.generation:
+            self.thumbnails_shown.emit(thumbnails)
+
+    def flush(self):
+        if self.request_timer.isActive():
+            self.request_timer.stop()
+            self.submit()
+        self.pool.waitForDone()
+        QCoreApplication.sendPostedEvents(None, QEvent.MetaCall)
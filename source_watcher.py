@@ -0,0 +1,169 @@
+#source_watcher.py
+# Vigila en disco la imagen abierta y los archivos de paleta de los Coppers. Un cambio se
+# avisa una sola vez aunque el programa que guarda escriba a trozos (debounce), y la relectura
+# y conversión del archivo van en un hilo aparte. Qué líneas y Coppers cambian lo decide el
+# editor al recibir el resultado, comparándolo con su estado de ese momento.
+import os
+
+import numpy as np
+from PIL import Image
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, QFileSystemWatcher, QCoreApplication, QEvent, pyqtSignal
+
+from frame_set import indexed_frame
+from palette_library import default_library
+from quantizer import genesis_codes
+from remap import palette_lookup
+
+# Espera desde el último aviso del sistema antes de releer
+DEBOUNCE_MS = 200
+# Guardado atómico (archivo temporal + renombrado): el archivo puede faltar un momento
+MAX_MISSING_CHECKS = 25
+
+
+def read_image(path):
+    with Image.open(path) as image:
+        image.load()
+    return image
+
+
+def image_palette(image):
+    raw_palette = image.getpalette() or []
+    return [tuple(raw_palette[i:i + 3]) for i in range(0, len(raw_palette), 3)]
+
+
+def nearest_indices(image, line_palettes, palettes):
+    # Cada línea al color más cercano de la paleta con la que se ve: no se vuelve a cuantizar,
+    # así que los Coppers y sus paletas se quedan como están
+    codes = genesis_codes(np.asarray(image.convert("RGB")))
+    indices = np.empty(codes.shape, dtype=np.uint8)
+    for palette_id in np.unique(line_palettes).tolist():
+        rows = line_palettes == palette_id
+        indices[rows] = palette_lookup(palettes[palette_id])[codes[rows]]
+    return indices
+
+
+def load_image_source(path, line_palettes, palettes, reference=None, with_palette=True):
+    # Devuelve (índices, paleta de la imagen o None, imagen). En modo P los índices se toman
+    # tal cual; un fotograma va sobre la paleta de la imagen de referencia, como al abrirlo.
+    # Sin referencia (proyecto cuya imagen ya no está) un fotograma no cambia la paleta
+    image = read_image(path)
+    if reference is not None and reference.mode == "P":
+        return indexed_frame(image, reference), None, image
+    if reference is None and image.mode == "P":
+        return np.asarray(image, dtype=np.uint8), image_palette(image) if with_palette else None, image
+    return nearest_indices(image, line_palettes, palettes), None, image
+
+
+def load_palette_source(path):
+    # La biblioteca vuelve a leer el archivo porque ha cambiado su fecha de modificación
+    return default_library.load(path, size=16)
+
+
+def changed_spans(old, new):
+    # Tramos [inicio, fin) de filas con algún píxel distinto
+    changed = (old != new).any(axis=1)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], changed.view(np.int8), [0]))))
+    return list(zip(edges[0::2].tolist(), edges[1::2].tolist()))
+
+
+class LoadJob(QRunnable):
+    def __init__(self, watcher, path, generation, function, args):
+        super().__init__()
+        self.watcher = watcher
+        self.path = path
+        self.generation = generation
+        self.function = function
+        self.args = args
+
+    def run(self):
+        try:
+            result = self.function(self.path, *self.args)
+        except (OSError, ValueError, SyntaxError) as error:
+            # Archivo a medio escribir o ilegible: el siguiente aviso volverá a intentarlo
+            self.watcher.job_done.emit(self.path, self.generation, error)
+            return
+        self.watcher.job_done.emit(self.path, self.generation, result)
+
+
+class SourceWatcher(QObject):
+    # source_changed: el archivo ha cambiado (ya sin avisos durante DEBOUNCE_MS); quien lo
+    # recibe llama a load con la función que lo convierte. source_loaded / source_failed
+    # llegan en el hilo de la interfaz con el resultado o el error
+    source_changed = pyqtSignal(str)
+    source_loaded = pyqtSignal(str, object)
+    source_failed = pyqtSignal(str, object)
+    job_done = pyqtSignal(str, int, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.on_file_changed)
+        self.paths = set()
+        # Rutas con cambios pendientes de avisar y cuántas veces se han encontrado sin archivo
+        self.pending = {}
+        # Un trabajo más reciente sobre la misma ruta deja obsoletos los anteriores
+        self.generations = {}
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.job_done.connect(self.on_job_done)
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(DEBOUNCE_MS)
+        self.debounce_timer.timeout.connect(self.flush_pending)
+
+    def watch(self, paths):
+        # Sustituye el conjunto vigilado; solo se tocan las rutas que entran o salen
+        paths = {os.path.abspath(path) for path in paths if path}
+        removed = self.paths - paths
+        if removed:
+            self.watcher.removePaths([path for path in removed if path in self.watcher.files()])
+        for path in removed:
+            self.pending.pop(path, None)
+        self.paths = paths
+        self.add_missing_paths()
+
+    def add_missing_paths(self):
+        watched = set(self.watcher.files())
+        added = [path for path in self.paths if path not in watched and os.path.exists(path)]
+        if added:
+            self.watcher.addPaths(added)
+
+    def on_file_changed(self, path):
+        path = os.path.abspath(path)
+        if path in self.paths:
+            self.pending[path] = 0
+            self.debounce_timer.start()
+
+    def flush_pending(self):
+        # Tras un renombrado el sistema deja de vigilar la ruta: se vuelve a añadir
+        self.add_missing_paths()
+        for path, missing in list(self.pending.items()):
+            if os.path.exists(path):
+                del self.pending[path]
+                self.source_changed.emit(path)
+            elif missing + 1 < MAX_MISSING_CHECKS:
+                self.pending[path] = missing + 1
+            else:
+                del self.pending[path]
+        if self.pending:
+            self.debounce_timer.start()
+
+    def load(self, path, function, *args):
+        self.generations[path] = self.generations.get(path, 0) + 1
+        self.pool.start(LoadJob(self, path, self.generations[path], function, args))
+
+    def on_job_done(self, path, generation, result):
+        if generation != self.generations.get(path) or path not in self.paths:
+            return
+        if isinstance(result, Exception):
+            self.source_failed.emit(path, result)
+        else:
+            self.source_loaded.emit(path, result)
+
+    def flush(self):
+        # Avisa ya de los cambios pendientes y espera a sus lecturas (pruebas y benchmarks)
+        if self.debounce_timer.isActive():
+            self.debounce_timer.stop()
+            self.flush_pending()
+        self.pool.waitForDone()
+        QCoreApplication.sendPostedEvents(None, QEvent.MetaCall)